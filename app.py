@@ -1,11 +1,9 @@
 import streamlit as st
 from scripts.cheese_chatbot import FoodChatbot
+from scripts.telemetry import configure_logging, serve_metrics
 import os
-import json
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import itertools
+import uuid
 
 # Set page config
 st.set_page_config(
@@ -22,6 +20,11 @@ if "show_json" not in st.session_state:
     st.session_state.show_json = False
 if "relevant_products" not in st.session_state:
     st.session_state.relevant_products = "I'm a chatbot."
+# Keys this browser session's conversation in the shared chatbot; it is kept in
+# the URL so a reload, or a restart with SESSION_DB_PATH set, resumes the conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("session") or uuid.uuid4().hex
+st.query_params["session"] = st.session_state.session_id
 
 # Custom CSS
 st.markdown("""
@@ -175,20 +178,27 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Initialize chatbot
+# Logging and the /metrics endpoint (METRICS_PORT) are set up once per process
+@st.cache_resource
+def start_telemetry():
+    configure_logging()
+    return serve_metrics()
+
+start_telemetry()
+
+# Initialize chatbot; one instance is shared by every session, which keeps
+# its own conversation under st.session_state.session_id
 @st.cache_resource
 def get_chatbot():
     return FoodChatbot()
 
 chatbot = get_chatbot()
 
-# Load JSON data
-@st.cache_data
-def load_json_data():
-    with open("fixture/cheese_data.json", 'r', encoding='utf-8') as f:
-        return json.load(f)
-
-json_data = load_json_data()
+# A resumed session starts with no messages on screen; show the turns the chatbot remembers
+if not st.session_state.messages:
+    for user_message, assistant_message in list(chatbot.memory_for(st.session_state.session_id).turns):
+        st.session_state.messages.append({"role": "user", "content": user_message})
+        st.session_state.messages.append({"role": "assistant", "content": assistant_message})
 
 # Header
 st.markdown("""
@@ -240,9 +250,10 @@ with st.sidebar:
         st.markdown('</div>', unsafe_allow_html=True)
 
 # Chat interface
-def display_chat_message(role, content):
+def display_chat_message(role, content, container=None):
+    container = container or st
     if role == "user":
-        st.markdown(f"""
+        container.markdown(f"""
             <div class="chat-message user">
                 <div class="content">
                     <div class="avatar">👤</div>
@@ -251,7 +262,7 @@ def display_chat_message(role, content):
             </div>
         """, unsafe_allow_html=True)
     else:
-        st.markdown(f"""
+        container.markdown(f"""
             <div class="chat-message assistant">
                 <div class="content">
                     <div class="avatar">🧀</div>
@@ -272,19 +283,27 @@ if user_input:
     st.session_state.messages.append({"role": "user", "content": user_input})
     display_chat_message("user", user_input)
     
-    # Get chatbot response
-    with st.spinner("Thinking..."):
-        try:
-            response = chatbot.chat(user_input)
-            print(response)
-            st.session_state.relevant_products = response[1]
-            response = response[0]
-            # Add assistant message to chat history
-            st.session_state.messages.append({"role": "assistant", "content": response})
-            display_chat_message("assistant", response)
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
-            st.info("Please try again or rephrase your question.")
+    # Stream chatbot response into a placeholder as it is generated
+    placeholder = st.empty()
+    try:
+        response = ""
+        with st.spinner("Thinking..."):
+            chunks = chatbot.chat_stream(user_input, session_id=st.session_state.session_id)
+            # Retrieval happens before the first delta, keep the spinner until then
+            first = next(chunks)
+        for chunk in itertools.chain([first], chunks):
+            if isinstance(chunk, dict):
+                st.session_state.relevant_products = chunk["products"]
+                response = chunk["response"]
+                break
+            response += chunk
+            display_chat_message("assistant", response, placeholder)
+        display_chat_message("assistant", response, placeholder)
+        # Add assistant message to chat history
+        st.session_state.messages.append({"role": "assistant", "content": response})
+    except Exception as e:
+        st.error(f"An error occurred: {str(e)}")
+        st.info("Please try again or rephrase your question.")
 
 # Footer
 st.markdown("""
@@ -297,4 +316,5 @@ st.markdown("""
 # Add a clear chat button in the sidebar
 if st.sidebar.button("Clear Chat History"):
     st.session_state.messages = []
+    chatbot.clear_history(st.session_state.session_id)
     st.rerun()
\ No newline at end of file
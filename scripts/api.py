@@ -0,0 +1,264 @@
+"""HTTP API for the cheese assistant.
+
+    POST /chat    {"message": ..., "session_id": ..., "stream": true}
+                  streams Server-Sent Events: "delta" events with text,
+                  then one "done" event with the full response and products;
+                  a session_id is issued when none is sent and returned
+                  with the answer, so follow-up turns can continue it
+    GET  /search  ?q=...&k=5, fused retrieval results without a completion
+    GET  /healthz, GET /metrics
+
+Run with `python -m scripts.api` or `uvicorn scripts.api:app`.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from .async_chatbot import AsyncFoodChatbot
+from .cheese_chatbot import FoodChatbot
+from .telemetry import configure_logging, telemetry
+
+logger = logging.getLogger(__name__)
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# Turns running at once per worker; more wait for a slot
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "32"))
+# Turns allowed to wait for a slot before new ones are turned away with 503
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "64"))
+# Seconds a turn may wait for a slot
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "10"))
+# Seconds shutdown waits for in-flight turns to finish
+API_SHUTDOWN_TIMEOUT = float(os.getenv("API_SHUTDOWN_TIMEOUT", "30"))
+MAX_MESSAGE_CHARS = 2000
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot get a slot; answered with 503."""
+
+
+class Limiter:
+    """Caps concurrent turns and the queue waiting for them.
+
+    Requests past the queue, or waiting longer than the timeout, are
+    rejected straight away so load sheds at the edge instead of piling up.
+    """
+
+    def __init__(self, concurrency: int = API_MAX_CONCURRENCY, max_queue: int = API_MAX_QUEUE,
+                 timeout: float = API_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.draining = False
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def acquire(self):
+        if self.draining:
+            raise Overloaded("shutting down")
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                telemetry.increment("api_rejected_total", reason="queue_full")
+                raise Overloaded("too many requests waiting")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                telemetry.increment("api_rejected_total", reason="queue_timeout")
+                raise Overloaded("timed out waiting for a slot")
+            finally:
+                self.waiting -= 1
+        else:
+            # A free slot is taken without yielding to the event loop
+            await self._semaphore.acquire()
+        self.active += 1
+        self._idle.clear()
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+        if self.active == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float):
+        """Stop admitting requests and wait for the active ones to finish."""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("shutdown with %d requests still running", self.active)
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """Streams while holding a limiter slot and gives it back however the response ends.
+
+    The release is here rather than in the body generator: a client that
+    disconnects before the first chunk gets the response cancelled before
+    the generator is ever entered, so its finally would never run.
+    """
+
+    def __init__(self, limiter: Limiter, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+def overloaded(e: Overloaded) -> JSONResponse:
+    return JSONResponse({"error": str(e)}, status_code=503, headers={"Retry-After": "1"})
+
+
+def product_json(match: Any) -> Dict[str, Any]:
+    return {"id": match.id, "score": match.score, "metadata": dict(match.metadata or {})}
+
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def chat(request: Request) -> Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "expected a JSON body"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "expected a JSON object"}, status_code=400)
+    message = str(body.get("message") or "").strip()
+    if not message or len(message) > MAX_MESSAGE_CHARS:
+        return JSONResponse({"error": f"message must be 1-{MAX_MESSAGE_CHARS} characters"}, status_code=400)
+    # Never fall back to the chatbot's default memory: it would be shared by every anonymous client
+    session_id = str(body.get("session_id") or uuid.uuid4().hex)
+    bot: AsyncFoodChatbot = request.app.state.bot
+    limiter: Limiter = request.app.state.limiter
+
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        return overloaded(e)
+
+    if not body.get("stream", True):
+        try:
+            response, products = await bot.chat(message, session_id)
+        finally:
+            limiter.release()
+        return JSONResponse({"response": response, "products": [product_json(m) for m in products], "session_id": session_id})
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for chunk in bot.chat_stream(message, session_id):
+                if isinstance(chunk, dict):
+                    yield sse("done", {"response": chunk["response"], "products": [product_json(m) for m in chunk["products"]],
+                                       "session_id": session_id})
+                else:
+                    yield sse("delta", {"text": chunk})
+        except Exception as e:
+            logger.exception("chat stream failed")
+            yield sse("error", {"error": str(e)})
+
+    return SlotStreamingResponse(limiter, events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Session-Id": session_id})
+
+
+async def search(request: Request) -> Response:
+    query = request.query_params.get("q", "").strip()
+    if not query or len(query) > MAX_MESSAGE_CHARS:
+        return JSONResponse({"error": f"q must be 1-{MAX_MESSAGE_CHARS} characters"}, status_code=400)
+    try:
+        k = max(1, min(int(request.query_params.get("k", "5")), 50))
+    except ValueError:
+        return JSONResponse({"error": "k must be an integer"}, status_code=400)
+    bot: AsyncFoodChatbot = request.app.state.bot
+    limiter: Limiter = request.app.state.limiter
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        return overloaded(e)
+    try:
+        retrieval = await bot.retrieve(query)
+    finally:
+        limiter.release()
+    return JSONResponse({
+        "products": [product_json(m) for m in retrieval.products[:k]],
+        "rows": retrieval.rows,
+        "sql_error": retrieval.sql.error if retrieval.sql else None,
+    })
+
+
+async def healthz(request: Request) -> Response:
+    limiter: Limiter = request.app.state.limiter
+    status = 503 if limiter.draining else 200
+    return JSONResponse({"active": limiter.active, "waiting": limiter.waiting, "draining": limiter.draining}, status_code=status)
+
+
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def default_bot() -> AsyncFoodChatbot:
+    # Every admitted turn may have a vector query and a SQL query on the executor at once
+    return AsyncFoodChatbot(FoodChatbot(max_workers=2 * API_MAX_CONCURRENCY))
+
+
+def create_app(bot_factory: Callable[[], AsyncFoodChatbot] = default_bot) -> Starlette:
+    """Build the app; the chatbot is created at startup and closed at shutdown."""
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette):
+        app.state.bot = bot = bot_factory()
+        app.state.limiter = Limiter()
+        try:
+            yield
+        finally:
+            await app.state.limiter.drain(API_SHUTDOWN_TIMEOUT)
+            await bot.aclose()
+            chatbot = bot.chatbot
+            chatbot.executor.shutdown(wait=False, cancel_futures=True)
+            chatbot.summary_executor.shutdown(wait=True)
+
+    return Starlette(
+        routes=[
+            Route("/chat", chat, methods=["POST"]),
+            Route("/search", search, methods=["GET"]),
+            Route("/healthz", healthz, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+
+
+app = create_app()
+
+
+def main():
+    import uvicorn
+
+    configure_logging()
+    uvicorn.run(
+        "scripts.api:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=API_WORKERS,
+        timeout_graceful_shutdown=int(API_SHUTDOWN_TIMEOUT),
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
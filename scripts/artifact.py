@@ -0,0 +1,258 @@
+"""Versioned catalog artifacts.
+
+`python -m scripts.artifact` compiles the scraped catalog JSON into one
+directory holding everything the chatbot reads at startup:
+
+    fixture/catalog/
+        CURRENT                     name of the live version
+        versions/<version>/
+            catalog.json            the source records
+            catalog.db              SQLite products, pairings, images and FTS index
+            vectors.npy, .json      local vector index (memory-mapped at startup)
+            vectors.manifest.json   content hashes for incremental re-embedding
+            manifest.json           version, source hash, counts
+
+The database of a new version starts from the live one with only the
+products the scraper reported as added, changed or removed reloaded, and
+vectors are reused for every product whose text did not change.
+
+A version is built in a staging directory, renamed into place and then
+published by replacing CURRENT, so readers only ever see complete
+versions. Running chatbots poll CURRENT and swap to a new version
+without restarting (see FoodChatbot.refresh_catalog).
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "./fixture/catalog")
+# Seconds between checks of CURRENT; a new version is picked up after this
+ARTIFACT_CHECK_INTERVAL = float(os.getenv("ARTIFACT_CHECK_INTERVAL", "5"))
+# Published versions kept on disk, counting the live one
+ARTIFACT_KEEP = int(os.getenv("ARTIFACT_KEEP", "3"))
+
+CATALOG_FILE = "catalog.json"
+DATABASE_FILE = "catalog.db"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+# Carried over from the live version so unchanged products are not re-embedded
+VECTOR_FILES = (VECTORS_FILE, "vectors.json", "vectors.manifest.json")
+
+
+def current_version(root: str = ARTIFACT_DIR) -> Optional[str]:
+    try:
+        with open(os.path.join(root, "CURRENT"), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+@dataclass
+class CatalogVersion:
+    """One published artifact directory."""
+    version: str
+    path: str
+    manifest: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def catalog_path(self) -> str:
+        return os.path.join(self.path, CATALOG_FILE)
+
+    @property
+    def database_path(self) -> str:
+        return os.path.join(self.path, DATABASE_FILE)
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, VECTORS_FILE)
+
+    @classmethod
+    def open(cls, version: str, root: str = ARTIFACT_DIR) -> "CatalogVersion":
+        path = os.path.join(root, "versions", version)
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return cls(version, path, json.load(f))
+
+    @classmethod
+    def current(cls, root: str = ARTIFACT_DIR) -> Optional["CatalogVersion"]:
+        """The published version, or None when nothing has been built."""
+        version = current_version(root)
+        return cls.open(version, root) if version else None
+
+
+class ArtifactWatcher:
+    """Reports a newly published version; CURRENT is read at most once per interval."""
+
+    def __init__(self, version: Optional[str] = None, root: str = ARTIFACT_DIR,
+                 check_interval: float = ARTIFACT_CHECK_INTERVAL):
+        self.root = root
+        # The version in use; set by whoever finishes swapping to a new one
+        self.version = version
+        self.check_interval = check_interval
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def poll(self) -> Optional[str]:
+        """The published version if it differs from the one in use, otherwise None."""
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return None
+        with self._lock:
+            if now - self._checked < self.check_interval:
+                return None
+            self._checked = now
+        version = current_version(self.root)
+        return version if version and version != self.version else None
+
+
+def publish(version: str, root: str = ARTIFACT_DIR):
+    """Point CURRENT at a built version in one atomic rename."""
+    tmp_path = os.path.join(root, "CURRENT.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, "CURRENT"))
+
+
+def prune(root: str = ARTIFACT_DIR, keep: int = ARTIFACT_KEEP) -> List[str]:
+    """Remove the oldest versions beyond `keep`, never the live one.
+
+    Processes still on a removed version keep working: their open files
+    and memory maps stay valid until they swap.
+    """
+    versions_dir = os.path.join(root, "versions")
+    live = current_version(root)
+    # Version names start with the build time, so they sort oldest first
+    versions = sorted(v for v in os.listdir(versions_dir) if not v.startswith("."))
+    removed = [v for v in versions[:max(0, len(versions) - keep)] if v != live]
+    for version in removed:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+    return removed
+
+
+def _changes_since(live: CatalogVersion, catalog_path: str, data: List[Dict[str, Any]], catalog: str) -> Dict[str, List[str]]:
+    """SKUs changed since the live version: the scraper's changes file when it spans the two, otherwise a diff."""
+    from .scraper import changes_path, diff_catalogs, load_catalog
+
+    try:
+        with open(changes_path(catalog_path), 'r', encoding='utf-8') as f:
+            changes = json.load(f)
+    except (OSError, ValueError):
+        changes = {}
+    if live.manifest.get("catalog") and changes.get("base") == live.manifest["catalog"] and changes.get("catalog") == catalog:
+        return changes
+    return diff_catalogs(load_catalog(live.catalog_path), data)
+
+
+def _build_database(data_path: str, db_path: str, client, base_path: Optional[str] = None,
+                    changes: Optional[Dict[str, List[str]]] = None):
+    """Load the catalog into a new database, or apply changes to a copy of base_path."""
+    from .cheese_sql_chatbot import CheeseSQLChatbot
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    if base_path is not None:
+        shutil.copy2(base_path, db_path)
+    sql_chatbot = CheeseSQLChatbot(db_path, client=client, pool_size=1)
+    if base_path is not None:
+        sql_chatbot.apply_changes(data_path, changes)
+    else:
+        sql_chatbot.load_data_from_json(data_path)
+    sql_chatbot.pool.close()
+    # Published databases are only ever opened read-only: no WAL files, no free pages
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def build(catalog_path: str, root: str = ARTIFACT_DIR, use_pinecone: bool = False, index_name: Optional[str] = None,
+          force: bool = False) -> CatalogVersion:
+    """Compile catalog_path into a new version and publish it.
+
+    Nothing is built when the live version came from the same records and
+    embedding model, unless force is set. The live version's database is
+    copied and only the changed SKUs reloaded (force loads everything), and
+    vectors of products whose text did not change are copied from the live
+    version; a failed build keeps
+    its staging directory, and with it the embedding checkpoint, so the
+    next attempt resumes.
+    """
+    from . import convert_data
+    from .scraper import catalog_hash
+
+    data = convert_data.load_json_data(catalog_path)
+    source = convert_data.content_hash(data, convert_data.EMBEDDING_MODEL)
+    live = CatalogVersion.current(root)
+    if live is not None and live.manifest.get("source") == source and not force:
+        print(f"Catalog unchanged, version {live.version} is current")
+        return live
+
+    versions_dir = os.path.join(root, "versions")
+    staging = os.path.join(versions_dir, f".build-{source[:16]}")
+    os.makedirs(staging, exist_ok=True)
+    if live is not None:
+        for name in VECTOR_FILES:
+            if os.path.exists(os.path.join(live.path, name)) and not os.path.exists(os.path.join(staging, name)):
+                shutil.copy2(os.path.join(live.path, name), os.path.join(staging, name))
+
+    data_path = os.path.join(staging, CATALOG_FILE)
+    with open(data_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    catalog = catalog_hash(data)
+    if live is not None and not force:
+        changes = _changes_since(live, catalog_path, data, catalog)
+        touched = sum(len(changes.get(key, [])) for key in ("added", "changed", "removed"))
+        print(f"Updating SQLite database from version {live.version} ({touched} SKUs changed)...")
+        _build_database(data_path, os.path.join(staging, DATABASE_FILE), convert_data.clients.openai,
+                        live.database_path, changes)
+    else:
+        print("Building SQLite database...")
+        _build_database(data_path, os.path.join(staging, DATABASE_FILE), convert_data.clients.openai)
+    convert_data.create_vector_db_from_food_products(
+        data_path, index_name or convert_data.INDEX_NAME, local_index_path=os.path.join(staging, VECTORS_FILE),
+        use_pinecone=use_pinecone
+    )
+
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{source[:8]}"
+    manifest = {
+        "version": version,
+        "source": source,
+        "catalog": catalog,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "products": len(data),
+        "embedding_model": convert_data.EMBEDDING_MODEL,
+        "files": {name: os.path.getsize(os.path.join(staging, name)) for name in sorted(os.listdir(staging))},
+    }
+    with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(staging, os.path.join(versions_dir, version))
+    publish(version, root)
+    removed = prune(root)
+    print(f"Published catalog version {version} ({len(data)} products)" + (f", removed {len(removed)} old versions" if removed else ""))
+    return CatalogVersion.open(version, root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the catalog JSON into a versioned artifact and publish it.")
+    parser.add_argument("--catalog", default="./fixture/cheese_data.json")
+    parser.add_argument("--root", default=ARTIFACT_DIR)
+    parser.add_argument("--pinecone", action="store_true", help="also sync changed vectors to Pinecone")
+    parser.add_argument("--force", action="store_true", help="build even if the catalog is unchanged")
+    args = parser.parse_args()
+    build(args.catalog, args.root, use_pinecone=args.pinecone, force=args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Async fronts for FoodChatbot and CheeseSQLChatbot.
+
+Model calls go through AsyncOpenAI so a worker can hold many turns in
+flight on one event loop; SQLite, the local vector index and Pinecone stay
+synchronous and run on the wrapped chatbot's retrieval executor. State
+(caches, session memory, router, context builder) is shared with the
+wrapped sync objects.
+"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from .cheese_chatbot import (
+    CHAT_MODEL, COMPLETION_OPTIONS, EMBEDDING_MODEL, SQL_TIMEOUT, TEXT_SEARCH_MODE,
+    VECTOR_TIMEOUT, FoodChatbot, Retrieval, answer_cache,
+)
+from .cheese_sql_chatbot import SQL_COMPLETION_OPTIONS, CheeseSQLChatbot, SQLResult, sql_cache
+from .config import clients, new_async_openai
+from .retrievers import reciprocal_rank_fusion, row_match
+from .telemetry import telemetry
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCheeseSQLChatbot:
+    """Async text-to-SQL lookups over a shared CheeseSQLChatbot."""
+
+    def __init__(self, sql_chatbot: CheeseSQLChatbot, client: "AsyncOpenAI", run: Callable):
+        self.sql_chatbot = sql_chatbot
+        self.client = client
+        self._run = run
+
+    async def generate_sql_query(self, user_query: str) -> str:
+        with telemetry.span("sql_generation"):
+            response = await self.client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=self.sql_chatbot.sql_messages(user_query),
+                **SQL_COMPLETION_OPTIONS
+            )
+        telemetry.record_usage("sql_generation", CHAT_MODEL, response.usage)
+        return self.sql_chatbot.clean_sql(response.choices[0].message.content)
+
+    async def lookup(self, query: str) -> SQLResult:
+        """Async CheeseSQLChatbot.lookup, sharing its translation cache."""
+        key = self.sql_chatbot._cache_key(query)
+        sql_query = sql_cache.get(key)
+        cached = sql_query is not None
+        try:
+            if not cached:
+                sql_query = await self.generate_sql_query(query)
+            results = await self._run(self.sql_chatbot.execute_query, sql_query)
+        except Exception as e:
+            sql_cache.pop(key)
+            logger.warning("SQL lookup failed: %s", e)
+            return SQLResult(sql=sql_query, error=str(e), cached=cached)
+        if not cached:
+            sql_cache.set(key, sql_query)
+        return SQLResult(results, sql_query, cached=cached)
+
+    async def search_text(self, query: str, k: int = 5, match_all: bool = False) -> List[Dict[str, Any]]:
+        return await self._run(self.sql_chatbot.search_text, query, k, match_all)
+
+
+class AsyncFoodChatbot:
+    """Async FoodChatbot: the same routing, retrieval, fusion and memory, awaited."""
+
+    def __init__(self, chatbot: FoodChatbot, client: Optional["AsyncOpenAI"] = None):
+        self.chatbot = chatbot
+        self.client = client or new_async_openai()
+        self.sql_chatbot = AsyncCheeseSQLChatbot(chatbot.sql_chatbot, self.client, self._run)
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        """Run blocking work on the chatbot's retrieval executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.chatbot.executor, fn, *args)
+
+    async def embed_query(self, query: str) -> List[float]:
+        vector = clients.embedding_cache.get(EMBEDDING_MODEL, query)
+        if vector is not None:
+            return vector
+        with telemetry.span("embedding"):
+            response = await self.client.embeddings.create(input=query, model=EMBEDDING_MODEL)
+        telemetry.record_usage("embedding", EMBEDDING_MODEL, response.usage)
+        vector = response.data[0].embedding
+        clients.embedding_cache.set(EMBEDDING_MODEL, query, vector)
+        return vector
+
+    async def get_relevant_products(self, query: str, top_k: int = 3) -> List[Any]:
+        """Async FoodChatbot.get_relevant_products."""
+        text_matches = []
+        if TEXT_SEARCH_MODE != "off":
+            rows = await self.sql_chatbot.search_text(query, top_k, TEXT_SEARCH_MODE == "first")
+            text_matches = [row_match(row, row['score']) for row in rows]
+            if text_matches and TEXT_SEARCH_MODE == "first":
+                return text_matches
+        query_embedding = await self.embed_query(query)
+        with telemetry.span("vector_query"):
+            vector_matches = await self._run(self.chatbot.retriever.query, query_embedding, top_k)
+        if text_matches:
+            return reciprocal_rank_fusion([vector_matches, text_matches], top_k=top_k)
+        return vector_matches
+
+    async def _collect(self, branch: str, coro, timeout: float, default: Any) -> Any:
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s retrieval timed out", branch)
+            telemetry.increment("retrieval_timeouts_total", branch=branch.lower())
+        except Exception:
+            logger.exception("%s retrieval failed", branch)
+        return default
+
+    async def retrieve(self, query: str) -> Retrieval:
+        """Run the planned branches concurrently and fuse them, as FoodChatbot.retrieve does."""
+        with telemetry.span("retrieval"):
+            plan = self.chatbot.plan(query)
+            for branch, enabled in (("vector", plan.vector), ("sql", plan.sql)):
+                if not enabled:
+                    telemetry.increment("retrieval_skipped_total", branch=branch)
+            vector_matches, sql_result = await asyncio.gather(
+                self._collect("Vector", self.get_relevant_products(query), VECTOR_TIMEOUT, []) if plan.vector else _none([]),
+                self._collect("SQL", self.sql_chatbot.lookup(query), SQL_TIMEOUT, None) if plan.sql else _none(None),
+            )
+        return self.chatbot.fuse(vector_matches, sql_result, plan)
+
+    async def cached_answer(self, query: str, session_id: Optional[str] = None) -> Optional[Tuple[str, List[Any]]]:
+        """Async FoodChatbot.cached_answer."""
+        if not answer_cache.maxsize or not self.chatbot.standalone(query, session_id):
+            return None
+        with telemetry.span("answer_cache"):
+            version = self.chatbot.catalog_version()
+            cached = answer_cache.get(query, version, record_miss=False)
+            if cached is None:
+                vector = await self.embed_query(query) if await self.needs_embedding(query) else None
+                cached = answer_cache.get(query, version, vector)
+            return cached
+
+    async def needs_embedding(self, query: str) -> bool:
+        """Async FoodChatbot.needs_embedding."""
+        if not self.chatbot.plan(query).vector:
+            return False
+        return TEXT_SEARCH_MODE != "first" or not await self.sql_chatbot.search_text(query, 1, True)
+
+    async def prepare(self, query: str, session_id: Optional[str] = None) -> Tuple[Optional[str], str, List[Any]]:
+        """Async FoodChatbot.prepare."""
+        self.chatbot.refresh_catalog()
+        with telemetry.span("route"):
+            route = self.chatbot.lookup.route(query)
+        if route is not None:
+            telemetry.increment("routed_total", kind=route.kind, direct=route.answer is not None)
+            return route.answer, self.chatbot.format_product_info(route.matches), route.matches
+        cached = await self.cached_answer(query, session_id)
+        if cached is not None:
+            response, products = cached
+            return response, "", products
+        retrieval = await self.retrieve(query)
+        return None, self.chatbot.merge_context(retrieval), retrieval.products
+
+    async def stream_response(self, query: str, context: str, session_id: Optional[str] = None) -> AsyncIterator[str]:
+        messages = self.chatbot.build_messages(query, context, session_id)
+        with telemetry.span("completion"):
+            start = time.perf_counter()
+            stream = await self.client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                **COMPLETION_OPTIONS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            first = True
+            async for chunk in stream:
+                if not chunk.choices:
+                    telemetry.record_usage("completion", CHAT_MODEL, chunk.usage)
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first:
+                        telemetry.observe("time_to_first_token_seconds", time.perf_counter() - start)
+                        first = False
+                    yield delta
+
+    async def chat_stream(self, query: str, session_id: Optional[str] = None) -> AsyncIterator[Union[str, Dict[str, Any]]]:
+        """Async FoodChatbot.chat_stream: text deltas, then {"response", "products"}."""
+        with telemetry.span("chat", stream=True):
+            answer, context, products = await self.prepare(query, session_id)
+            parts = []
+            if answer is not None:
+                parts.append(answer)
+                yield answer
+            else:
+                async for delta in self.stream_response(query, context, session_id):
+                    parts.append(delta)
+                    yield delta
+            response = "".join(parts)
+            if answer is None and self.chatbot.memory_for(session_id).is_empty():
+                self.chatbot.remember_answer(query, response, products)
+            # Saving a session writes to SQLite, so keep it off the event loop
+            await self._run(self.chatbot.update_history, query, response, session_id)
+        yield {"response": response, "products": products}
+
+    async def chat(self, query: str, session_id: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Async FoodChatbot.chat, returning (response, products)."""
+        async for chunk in self.chat_stream(query, session_id):
+            if isinstance(chunk, dict):
+                return chunk["response"], chunk["products"]
+
+    async def aclose(self):
+        await self.client.close()
+
+
+async def _none(value: Any) -> Any:
+    return value
@@ -0,0 +1,349 @@
+import os
+
+# Run offline: the SDK constructors only need some key
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+os.environ.setdefault("PINECONE_API_KEY", "offline-benchmark")
+os.environ.setdefault("EMBEDDING_MODEL", "fake-embedding")
+os.environ.setdefault("CHAT_MODEL", "fake-chat")
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable
+
+from . import cheese_chatbot, cheese_sql_chatbot, convert_data
+from .cache import EmbeddingCache
+from .config import INDEX_NAME, clients
+from .cheese_chatbot import FoodChatbot
+from .cheese_sql_chatbot import CheeseSQLChatbot
+from .fakes import FakeOpenAI, FakeIndex, Latency, Recording, RecordingOpenAI, RecordingIndex, synthetic_embedding
+from .retrievers import LocalVectorIndex, PineconeRetriever, product_metadata
+
+# Questions a typical session asks: sidebar examples, lookups and filters
+WORKLOAD = [
+    "What kind of cheddar do you have?",
+    "Can you recommend a cheese for my wine?",
+    "How should I store this cheese?",
+    "Tell me about your artisanal cheeses",
+    "124254",
+    "cheapest mozzarella",
+    "feta crumbles",
+    "Do you have any Tillamook cheese?",
+    "Which sliced cheese costs less than $30?",
+    "mozzarella cheese for pizza",
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Count, mean and p50/p95/p99 of durations, in milliseconds."""
+    values = sorted(d * 1000 for d in durations)
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) if values else 0.0,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else 0.0,
+    }
+
+
+class StageTimer:
+    """Collects wall time per named stage by wrapping methods on live objects."""
+
+    def __init__(self):
+        self.durations = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, obj: Any, method: str, stage: str):
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(obj, method, timed)
+
+    def record(self, stage: str, duration: float):
+        with self._lock:
+            self.durations[stage].append(duration)
+
+    def reset(self):
+        with self._lock:
+            self.durations = defaultdict(list)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: summarize(values) for stage, values in sorted(self.durations.items())}
+
+
+def instrument(chatbot: FoodChatbot, timer: StageTimer):
+    """Time each pipeline stage of a FoodChatbot and its SQL bot."""
+    sql_chatbot = chatbot.sql_chatbot
+    for obj, method, stage in (
+        (chatbot.lookup, "route", "route"),
+        (chatbot, "retrieve", "retrieval"),
+        (chatbot, "get_relevant_products", "vector_branch"),
+        (chatbot, "embed_query", "embedding"),
+        (chatbot.retriever, "query", "vector_query"),
+        (sql_chatbot, "search_text", "text_search"),
+        (chatbot, "get_sql_results", "sql_branch"),
+        (sql_chatbot, "generate_sql_query", "sql_generation"),
+        (sql_chatbot, "execute_query", "sql_execution"),
+        (chatbot, "build_messages", "prompt_assembly"),
+        (chatbot, "generate_response", "completion"),
+    ):
+        timer.wrap(obj, method, stage)
+
+
+def run_load(call: Callable[[str], Any], queries: List[str], users: int, rounds: int) -> Dict[str, Any]:
+    """Have `users` threads each send every query `rounds` times; time each call."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def user(offset: int):
+        for _ in range(rounds):
+            for i in range(len(queries)):
+                # Stagger users so they are not all asking the same question at once
+                query = queries[(i + offset) % len(queries)]
+                start = time.perf_counter()
+                try:
+                    call(query)
+                except Exception as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    wall = time.perf_counter() - start
+    return {
+        "users": users,
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "wall_s": wall,
+        "qps": len(latencies) / wall if wall else 0.0,
+        "latency": summarize(latencies),
+    }
+
+
+def build_fakes(args, catalog: List[Dict[str, Any]]):
+    """Fake OpenAI client and Pinecone index with the configured latencies."""
+    recording = Recording(args.recording) if args.recording else None
+    openai_client = FakeOpenAI(
+        recording=recording,
+        embedding_latency=Latency(args.embedding_latency, args.jitter, seed=1),
+        completion_latency=Latency(args.completion_latency, args.jitter, seed=2),
+        token_latency=args.token_latency,
+    )
+    ids = [f"product_{p.get('SKU_number', i)}" for i, p in enumerate(catalog)]
+    embeddings = [synthetic_embedding(convert_data.prepare_product_text(p)) for p in catalog]
+    local_index = LocalVectorIndex.build(ids, embeddings, [product_metadata(p) for p in catalog])
+    index = FakeIndex(local_index, recording=recording, latency=Latency(args.vector_latency, args.jitter, seed=3))
+    return openai_client, index
+
+
+def clear_caches():
+    clients.embedding_cache.clear()
+    cheese_sql_chatbot.sql_cache.clear()
+    cheese_chatbot.answer_cache.clear()
+
+
+def bench_chat(args, openai_client, index, db_path: str) -> Dict[str, Any]:
+    """Concurrent FoodChatbot.chat and CheeseSQLChatbot.chat runs per user count."""
+    timer = StageTimer()
+    sql_chatbot = CheeseSQLChatbot(db_path, client=openai_client)
+    chatbot = FoodChatbot(retriever=PineconeRetriever(index), sql_chatbot=sql_chatbot, openai_client=openai_client)
+    instrument(chatbot, timer)
+
+    results = {"food_chat": [], "sql_chat": []}
+    for users in args.users:
+        for scenario, call in (("food_chat", chatbot.chat), ("sql_chat", sql_chatbot.chat)):
+            clear_caches()
+            chatbot.clear_history()
+            timer.reset()
+            run = run_load(call, WORKLOAD, users, args.rounds)
+            run["stages"] = timer.summary()
+            run["embedding_cache"] = clients.embedding_cache.stats()
+            run["sql_cache"] = cheese_sql_chatbot.sql_cache.stats()
+            run["answer_cache"] = cheese_chatbot.answer_cache.stats()
+            results[scenario].append(run)
+    chatbot.executor.shutdown()
+    chatbot.summary_executor.shutdown()
+    return results
+
+
+def bench_ingest(args, openai_client, workdir: str) -> Dict[str, Any]:
+    """Time convert_data.create_vector_db_from_food_products against the local index."""
+    # convert_data asks the shared container for its client; point it at the fake for this run
+    previous = clients.override(openai=openai_client)
+    try:
+        start = time.perf_counter()
+        _, local_index = convert_data.create_vector_db_from_food_products(
+            args.catalog, None, local_index_path=os.path.join(workdir, "vectors.npy"), use_pinecone=False
+        )
+        wall = time.perf_counter() - start
+        # A second run over the unchanged catalog only re-hashes and rewrites the index
+        start = time.perf_counter()
+        convert_data.create_vector_db_from_food_products(
+            args.catalog, None, local_index_path=os.path.join(workdir, "vectors.npy"), use_pinecone=False
+        )
+        refresh_wall = time.perf_counter() - start
+    finally:
+        clients.override(**previous)
+    return {"products": len(local_index), "wall_s": wall, "products_per_s": len(local_index) / wall, "refresh_wall_s": refresh_wall}
+
+
+# Each runs in a fresh interpreter with no API keys, from an empty working
+# directory, as a cold start would
+STARTUP_SNIPPETS = {
+    "import_chatbot": "import scripts.cheese_chatbot",
+    "import_api": "import scripts.api",
+    "construct_chatbot": (
+        "from scripts.cheese_chatbot import FoodChatbot; from scripts.cheese_sql_chatbot import CheeseSQLChatbot; "
+        "FoodChatbot(sql_chatbot=CheeseSQLChatbot({db!r}))"
+    ),
+}
+
+
+def bench_startup(args, db_path: str) -> Dict[str, Any]:
+    """Cold-start wall time of importing the modules and building a FoodChatbot, offline.
+
+    Fails if a module reads a path relative to the working directory or
+    writes a file while starting up.
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "PINECONE_API_KEY")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    env["CATALOG_PATH"] = os.path.abspath(args.catalog)
+    results = {}
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, snippet in STARTUP_SNIPPETS.items():
+            code = f"import time; start = time.perf_counter(); {snippet.format(db=db_path)}; print(time.perf_counter() - start)"
+            durations = []
+            for _ in range(args.startup_runs):
+                out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=cwd)
+                if out.returncode != 0:
+                    raise RuntimeError(f"{name} failed:\n{out.stderr}")
+                durations.append(float(out.stdout.strip().splitlines()[-1]))
+            if os.listdir(cwd):
+                raise RuntimeError(f"{name} wrote {os.listdir(cwd)} while starting up")
+            results[name] = summarize(durations)
+    return results
+
+
+def record(args):
+    """Run the workload once against the real services, saving their responses."""
+    recording = Recording(args.record)
+    openai_client = RecordingOpenAI(clients.openai, recording)
+    index = RecordingIndex(clients.pinecone.Index(INDEX_NAME), recording)
+    chatbot = FoodChatbot(retriever=PineconeRetriever(index), openai_client=openai_client)
+    for query in WORKLOAD:
+        chatbot.chat(query)
+    recording.save()
+    print(f"Recorded {len(WORKLOAD)} turns to {args.record}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: Dict[str, Any]):
+    for scenario, runs in report["chat"].items():
+        print(f"\n{scenario}")
+        print(f"{'users':>5} {'qps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}")
+        for run in runs:
+            latency = run["latency"]
+            print(f"{run['users']:>5} {run['qps']:>8.2f} {latency['p50_ms']:>9.1f} {latency['p95_ms']:>9.1f} {latency['p99_ms']:>9.1f} {run['errors']:>6}")
+        stages = runs[-1]["stages"]
+        if stages:
+            print(f"  stages at {runs[-1]['users']} users (p50 / p95 ms):")
+            for stage, summary in stages.items():
+                print(f"    {stage:<16} {summary['p50_ms']:>8.2f} / {summary['p95_ms']:>8.2f}  (n={summary['count']})")
+    if report.get("startup"):
+        print("\nstartup (p50 / max ms):")
+        for name, summary in report["startup"].items():
+            print(f"  {name:<18} {summary['p50_ms']:>8.1f} / {summary['max_ms']:>8.1f}")
+    if report.get("ingest"):
+        ingest = report["ingest"]
+        print(f"\ningest: {ingest['products']} products in {ingest['wall_s']:.2f}s ({ingest['products_per_s']:.1f}/s)")
+        print(f"refresh with no catalog changes: {ingest['refresh_wall_s']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline latency and throughput benchmark for the chat pipeline.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="concurrent user counts to run")
+    parser.add_argument("--rounds", type=int, default=2, help="passes over the workload per user")
+    parser.add_argument("--embedding-latency", type=float, default=0.08, help="seconds per embedding call")
+    parser.add_argument("--vector-latency", type=float, default=0.05, help="seconds per vector query")
+    parser.add_argument("--completion-latency", type=float, default=0.4, help="seconds to first completion token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per completion token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter on each latency")
+    parser.add_argument("--recording", help="replay responses from this recording file")
+    parser.add_argument("--record", help="call the real services and save a recording here instead of benchmarking")
+    parser.add_argument("--catalog", default="./fixture/cheese_data.json")
+    parser.add_argument("--database", default="./fixture/cheese_database.db")
+    parser.add_argument("--skip-ingest", action="store_true", help="skip the ingestion benchmark")
+    parser.add_argument("--skip-startup", action="store_true", help="skip the cold-start benchmark")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh interpreters per startup measurement")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON report")
+    args = parser.parse_args()
+    # In memory only: the persistent cache would carry hits over between runs, and skip calls while recording
+    clients.override(embedding_cache=EmbeddingCache(path=None))
+
+    if args.record:
+        record(args)
+        return
+
+    catalog = convert_data.load_json_data(args.catalog)
+    openai_client, index = build_fakes(args, catalog)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Work on a copy so the fixture database is never written to
+        db_path = os.path.join(workdir, "cheese_database.db")
+        shutil.copy(args.database, db_path)
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "git_commit": git_commit(),
+                "python": platform.python_version(),
+                "config": {k: v for k, v in vars(args).items() if k not in ("output", "record")},
+            },
+            "chat": bench_chat(args, openai_client, index, db_path),
+        }
+        if not args.skip_startup:
+            report["startup"] = bench_startup(args, db_path)
+        if not args.skip_ingest:
+            report["ingest"] = bench_ingest(args, openai_client, workdir)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default on-disk location for cached query embeddings; set to "" to keep them in memory only
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./fixture/embedding_cache.db")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "0")) or None
+
+# Answers to standalone questions; 0 disables the answer cache
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600")) or None
+# Cosine similarity at or above which two questions share an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+_MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """Cache of embeddings keyed by (model, normalized text).
+
+    Lookups go to an in-memory LRU first and then, when a path is given, to a
+    SQLite table that survives restarts. The table is opened on first use;
+    if it cannot be, embeddings are only kept in memory.
+    """
+
+    def __init__(self, path: Optional[str] = EMBEDDING_CACHE_PATH, maxsize: int = EMBEDDING_CACHE_SIZE, ttl: Optional[float] = EMBEDDING_CACHE_TTL):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.path = path or None
+        self.disk_hits = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._opened = not self.path
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (model, text)
+            )
+            ''')
+            conn.commit()
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("embedding cache %s unavailable, keeping embeddings in memory only: %s", self.path, e)
+            return None
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """The SQLite layer, opened on first use; None when there is none."""
+        if not self._opened:
+            with self._lock:
+                if not self._opened:
+                    self._conn = self._connect()
+                    self._opened = True
+        return self._conn
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, normalize_text(text))
+        vector = self.memory.get(key)
+        conn = self._disk() if vector is None else None
+        if conn is None:
+            return vector
+
+        with self._lock:
+            row = conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE model = ? AND text = ?", key
+            ).fetchone()
+        if row is None or (self.ttl and row[1] + self.ttl < time.time()):
+            return None
+        vector = array('f', row[0]).tolist()
+        self.disk_hits += 1
+        self.memory.set(key, vector)
+        return vector
+
+    def set(self, model: str, text: str, vector: List[float]):
+        key = (model, normalize_text(text))
+        self.memory.set(key, vector)
+        conn = self._disk()
+        if conn is None:
+            return
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text, vector, created_at) VALUES (?, ?, ?, ?)",
+                (*key, array('f', vector).tobytes(), time.time())
+            )
+            conn.commit()
+
+    def get_or_create(self, model: str, text: str, create: Callable[[], List[float]]) -> List[float]:
+        """Return the cached embedding, computing and storing it on a miss."""
+        vector = self.get(model, text)
+        if vector is None:
+            vector = create()
+            self.set(model, text, vector)
+        return vector
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        # A disk hit was first counted as a memory miss
+        stats["disk_hits"] = self.disk_hits
+        stats["misses"] -= self.disk_hits
+        total = stats["hits"] + self.disk_hits + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + self.disk_hits) / total if total else 0.0
+        return stats
+
+    def clear(self):
+        self.memory.clear()
+        conn = self._disk()
+        if conn is not None:
+            with self._lock:
+                conn.execute("DELETE FROM embeddings")
+                conn.commit()
+
+
+class SemanticCache:
+    """Answers keyed by question, matched exactly or by embedding similarity.
+
+    A lookup first tries the normalized question text, then (given the
+    question's embedding) the most similar cached question at or above the
+    threshold. Entries expire after ttl seconds, the least recently used are
+    evicted past maxsize, and everything is dropped when the catalog version
+    passed in changes.
+    """
+
+    def __init__(self, maxsize: int = ANSWER_CACHE_SIZE, ttl: Optional[float] = ANSWER_CACHE_TTL,
+                 threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        # normalized text -> (unit vector or None, value, expires)
+        self._entries = OrderedDict()
+        # Stacked vectors of the current entries, rebuilt lazily after changes
+        self._keys: List[str] = []
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: Hashable):
+        if version != self.version:
+            self._entries.clear()
+            self._matrix = None
+            self.version = version
+
+    def _search(self, vector: List[float]) -> Optional[str]:
+        if self._matrix is None:
+            self._keys = [k for k, entry in self._entries.items() if entry[0] is not None]
+            self._matrix = np.stack([self._entries[k][0] for k in self._keys]) if self._keys else np.empty((0, 0))
+        if not self._keys:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm:
+            return None
+        scores = self._matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        return self._keys[best] if scores[best] >= self.threshold else None
+
+    def get(self, text: str, version: Hashable, vector: Optional[List[float]] = None, record_miss: bool = True) -> Any:
+        """Return the cached value for the question, or None.
+
+        record_miss=False leaves a miss out of the stats, for a first
+        exact-text try that is followed by a lookup with the embedding.
+        """
+        if not self.maxsize:
+            return None
+        key = normalize_text(text)
+        with self._lock:
+            self._check_version(version)
+            semantic = False
+            if key not in self._entries and vector is not None:
+                key = self._search(vector)
+                semantic = True
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                self._matrix = None
+                entry = None
+            if entry is None:
+                self.misses += record_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.semantic_hits += semantic
+            return entry[1]
+
+    def set(self, text: str, version: Hashable, value: Any, vector: Optional[List[float]] = None):
+        if not self.maxsize:
+            return
+        unit = None
+        if vector is not None:
+            unit = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(unit)
+            unit = unit / norm if norm else None
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._check_version(version)
+            self._entries[normalize_text(text)] = (unit, value, expires)
+            self._entries.move_to_end(normalize_text(text))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -1,133 +1,485 @@
 import os
-from typing import List, Dict, Any
-from openai import OpenAI
-from pinecone import Pinecone
+import re
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Tuple, Union
 import json
-from .cheese_sql_chatbot import CheeseSQLChatbot
+from .config import INDEX_NAME, EMBEDDING_MODEL, CHAT_MODEL, clients
+from .cheese_sql_chatbot import CheeseSQLChatbot, SQLResult
+from .cache import SemanticCache
+from .router import ProductLookup, RetrievalPlan, plan_retrieval
+from .prompts import PromptFile
+from .context_builder import ContextBuilder
+from .memory import ConversationMemory, Turn
+from .sessions import SessionStore
+from .telemetry import telemetry, cache_collector, configure_logging
+from .artifact import ArtifactWatcher, CatalogVersion
+from .retrievers import Retriever, LocalVectorIndex, PineconeRetriever, Match, row_match, reciprocal_rank_fusion, LOCAL_INDEX_PATH
 
-from dotenv import load_dotenv
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
 
 # Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-INDEX_NAME = os.getenv("INDEX_NAME")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
-CHAT_MODEL = os.getenv("CHAT_MODEL")
+# Model that folds old turns into the conversation summary
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL") or CHAT_MODEL
 prompt_filename = "./fixture/prompt.txt"
+CATALOG_PATH = os.getenv("CATALOG_PATH", "./fixture/cheese_data.json")
+# "local" (NumPy index built by convert_data), "pinecone", or "auto" to prefer local when built
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+# Full-text tier: "first" answers from FTS when every keyword matches and skips the
+# embedding call, "fuse" merges FTS and vector rankings, "off" uses vectors only
+TEXT_SEARCH_MODE = os.getenv("TEXT_SEARCH_MODE", "first")
+# Per-branch retrieval timeouts in seconds, measured from when a worker starts the branch
+VECTOR_TIMEOUT = float(os.getenv("VECTOR_TIMEOUT", "10"))
+SQL_TIMEOUT = float(os.getenv("SQL_TIMEOUT", "15"))
+# Retrieval threads shared by every session: each turn runs up to two branches at once
+RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "16"))
+# Words that point back at earlier turns, so the answer depends on history
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|its|this|that|these|those|them|they|one|ones|more|else|another|other|same|above|previous|also)\b", re.IGNORECASE)
+# Sampling settings for answers, shared by the sync and async bots
+COMPLETION_OPTIONS = {"temperature": 0.7, "max_tokens": 10000}
+# "on" skips retrieval branches the query wording says will not contribute
+RETRIEVAL_PLANNER = os.getenv("RETRIEVAL_PLANNER", "on")
+
+# Finished answers to standalone questions, matched by text or embedding
+answer_cache = SemanticCache()
+# Read once, re-read when the file's mtime changes
+system_prompt = PromptFile(prompt_filename)
+telemetry.add_collector(cache_collector("embedding", lambda: clients.embedding_cache))
+telemetry.add_collector(cache_collector("answer", answer_cache))
+
+def __getattr__(name: str):
+    # The shared clients used to be built here at import; they are now built on first use
+    if name == "client":
+        return clients.openai
+    if name == "pc":
+        return clients.pinecone
+    if name == "embedding_cache":
+        return clients.embedding_cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def make_retriever(backend: str = VECTOR_BACKEND, catalog: Optional[CatalogVersion] = None) -> Retriever:
+    """Create the vector retriever for the configured backend, from the catalog artifact when given."""
+    path = catalog.vectors_path if catalog is not None else LOCAL_INDEX_PATH
+    if backend == "local" or (backend == "auto" and LocalVectorIndex.exists(path)):
+        return LocalVectorIndex.load(path)
+    if backend in ("pinecone", "auto"):
+        # Connected on the first query, not at startup
+        return PineconeRetriever(connect=lambda: clients.pinecone.Index(INDEX_NAME))
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+@dataclass
+class Retrieval:
+    """What the retrieval branches returned for one turn.
+
+    products is the fused ranking of every product either branch found;
+    rows holds SQL results that are not products, such as counts.
+    """
+    products: List[Match] = field(default_factory=list)
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    sql: Optional[SQLResult] = None
+    plan: RetrievalPlan = field(default_factory=RetrievalPlan)
+
+class _Branch:
+    """A retrieval branch on the shared pool that notes when a worker picks it up."""
 
-# Initialize clients
-client = OpenAI(api_key=OPENAI_API_KEY)
-pc = Pinecone(api_key=PINECONE_API_KEY)
+    def __init__(self, executor: ThreadPoolExecutor, fn, *args):
+        self.started = threading.Event()
+        self.start = 0.0
+        self.future = executor.submit(self._run, fn, *args)
+
+    def _run(self, fn, *args):
+        self.start = time.monotonic()
+        self.started.set()
+        return fn(*args)
+
+    def result(self, timeout: float) -> Any:
+        """The branch's result, waiting at most timeout seconds from when it started running."""
+        # Time queued behind other sessions' branches does not count against the deadline
+        while not self.started.wait(0.1):
+            if self.future.done():
+                # Cancelled before it ran, e.g. by shutdown
+                return self.future.result()
+        return self.future.result(timeout=max(0.0, self.start + timeout - time.monotonic()))
 
 class FoodChatbot:
-    def __init__(self):
-        self.index = pc.Index(INDEX_NAME)
-        self.conversation_history = []
+    def __init__(self, max_workers: int = RETRIEVAL_WORKERS, retriever: Optional[Retriever] = None, sql_chatbot: Optional[CheeseSQLChatbot] = None, lookup: Optional[ProductLookup] = None, openai_client: Optional["OpenAI"] = None):
+        self._client = openai_client
+        # The published catalog artifact is used, and followed as new versions
+        # are published, unless the catalog components are passed in
+        own_catalog = retriever is None and lookup is None and sql_chatbot is None
+        self.catalog = CatalogVersion.current() if own_catalog else None
+        self.watcher = ArtifactWatcher(self.catalog.version if self.catalog else None) if own_catalog else None
+        self._swapping = False
+        self._swap_lock = threading.Lock()
+        self.retriever = retriever or make_retriever(catalog=self.catalog)
+        # Exact SKU/UPC and brand/category hits are answered without retrieval
+        self.lookup = lookup or ProductLookup.from_json(self.catalog.catalog_path if self.catalog else CATALOG_PATH)
+        # One long-lived SQL bot sharing the same OpenAI client
+        if sql_chatbot is None and self.catalog is not None:
+            sql_chatbot = CheeseSQLChatbot(self.catalog.database_path, client=self._client, read_only=True)
+        self.sql_chatbot = sql_chatbot or CheeseSQLChatbot(client=self._client)
+        self.context_builder = ContextBuilder()
+        # Shared pool so the vector and SQL branches of a turn run side by side
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        # Summaries are written in the background, after the answer is sent
+        self.summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        # Conversation used when no session id is given (the CLI)
+        self.memory = self.new_memory()
+        # One conversation per session; the clients, indexes and pools above are shared
+        self.sessions = SessionStore(self.new_memory)
+
+    @property
+    def client(self) -> "OpenAI":
+        """The OpenAI client passed in, or the shared one, built on first use."""
+        return self._client or clients.openai
+
+    def new_memory(self) -> ConversationMemory:
+        return ConversationMemory(self.summarize_turns, self.summary_executor)
+
+    def memory_for(self, session_id: Optional[str] = None) -> ConversationMemory:
+        """The conversation memory of a session, or the default one."""
+        return self.memory if session_id is None else self.sessions.get(session_id)
+
+    @property
+    def conversation_history(self) -> List[Dict[str, str]]:
+        """The remembered conversation as chat messages."""
+        return self.memory.messages()
         
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a query, reusing cached embeddings for repeated questions."""
+        return clients.embedding_cache.get_or_create(EMBEDDING_MODEL, query, lambda: self._create_embedding(query))
+
+    def _create_embedding(self, query: str) -> List[float]:
+        with telemetry.span("embedding"):
+            response = self.client.embeddings.create(input=query, model=EMBEDDING_MODEL)
+        telemetry.record_usage("embedding", EMBEDDING_MODEL, response.usage)
+        return response.data[0].embedding
+
+    def get_text_matches(self, query: str, top_k: int = 3, match_all: bool = False) -> List[Match]:
+        """Keyword-search the SQLite catalog, shaped like vector matches."""
+        rows = self.sql_chatbot.search_text(query, k=top_k, match_all=match_all)
+        return [row_match(row, row['score']) for row in rows]
+
     def get_relevant_products(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Retrieve relevant products from Pinecone based on the query."""
-        # Generate embedding for the query
-        query_embedding = client.embeddings.create(
-            input=query,
-            model=EMBEDDING_MODEL
-        ).data[0].embedding
+        """Retrieve relevant products from full-text search and the vector index."""
+        text_matches = []
+        if TEXT_SEARCH_MODE != "off":
+            text_matches = self.get_text_matches(query, top_k, match_all=TEXT_SEARCH_MODE == "first")
+            if text_matches and TEXT_SEARCH_MODE == "first":
+                return text_matches
         
-        # Query Pinecone
-        results = self.index.query(
-            vector=query_embedding,
-            top_k=top_k,
-            include_metadata=True
-        )
+        # Generate embedding for the query, or reuse a cached one
+        query_embedding = self.embed_query(query)
         
-        return results.matches
+        # Query the local index or Pinecone
+        with telemetry.span("vector_query"):
+            vector_matches = self.retriever.query(query_embedding, top_k=top_k)
+        if text_matches:
+            return reciprocal_rank_fusion([vector_matches, text_matches], top_k=top_k)
+        return vector_matches
     
     def format_product_info(self, products: List[Dict[str, Any]]) -> str:
-        """Format product information for the context."""
-        formatted_info = []
-        for product in products:
-            info = f"Product: {product.metadata.get('name', 'N/A')}\n"
-            info += f"Category: {product.metadata.get('category', 'N/A')}\n"
-            info += f"Price: ${product.metadata.get('price', 'N/A')}\n"
-            if product.metadata.get('LB_price'):
-                info += f"Price per pound: ${product.metadata.get('LB_price')}/lb\n"
-            info += f"Brand: {product.metadata.get('brand', 'N/A')}\n"
-            info += f"Similarity Score: {product.score:.2f}\n"
-            info += f"Product URL: {product.metadata.get('product_url', 'N/A')}\n"
-            info += f"image_url: {product.metadata.get('image_url', 'N/A')}\n"
-            info += f"UPC: {product.metadata.get('UPC', 'N/A')}\n"
-            info += f"SKU: {product.metadata.get('SKU', 'N/A')}\n"
-            info += f"Related Products: {product.metadata.get('related_products', 'N/A')}\n"
-            formatted_info.append(info)
-        
-        return "\n".join(formatted_info)
+        """Format product information for the context, within the token budget."""
+        return self.context_builder.build(products)
     
-    def format_conversation_history(self) -> str:
-        """Format the conversation history for context."""
-        if not self.conversation_history:
-            return ""
-        
-        formatted_history = "Previous conversation:\n"
-        for message in self.conversation_history[-5:]:  # Only include last 5 exchanges
-            formatted_history += f"{message['role']}: {message['content']}\n"
-        return formatted_history
+    def summarize_turns(self, summary: str, turns: List[Turn]) -> str:
+        """Fold older exchanges into the running conversation summary."""
+        transcript = "\n".join(f"user: {user}\nassistant: {assistant}" for user, assistant in turns)
+        with telemetry.span("summarization"):
+            response = self.client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": "Update the summary of a conversation with a cheese shop assistant. "
+                     "Keep the products, preferences and constraints the user mentioned. Reply with at most five short lines."},
+                    {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{transcript}"},
+                ],
+                temperature=0,
+                max_tokens=200
+            )
+        telemetry.record_usage("summarization", SUMMARY_MODEL, response.usage)
+        return response.choices[0].message.content.strip()
     
-    def generate_response(self, query: str, context: str) -> str:
-        """Generate a response using GPT-4 with the retrieved context."""
+    def build_messages(self, query: str, context: str, session_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Assemble the chat messages for a turn."""
         # system_prompt = """You are a helpful food product assistant. Use the provided product information 
         # to answer questions about food products. Be concise, accurate, and helpful. If you don't have 
         # enough information to answer a question, say 'I'm sorry, I don't have enough information on that product.'."""
-        with open(prompt_filename, 'r', encoding='utf-8') as f:
-            system_prompt = f.read()
-        conversation_history = self.format_conversation_history()
-        full_context = f"{conversation_history}\n\nCurrent Product Information:\n{context}"
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Context:\n{full_context}\n\nQuestion: {query}"}
-        ]
-        response = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=10000
-        )
+        # Ordered from most to least stable so the provider can cache the prefix:
+        # the static prompt, then the product context (often unchanged on
+        # follow-up turns), then past turns, and the new question last.
+        with telemetry.span("prompt_assembly"):
+            return [
+                {"role": "system", "content": system_prompt.get()},
+                {"role": "system", "content": f"Current Product Information:\n{context}"},
+                *self.memory_for(session_id).messages(),  # Summary plus recent turns, within the memory budget
+                {"role": "user", "content": query}
+            ]
+
+    def generate_response(self, query: str, context: str, session_id: Optional[str] = None) -> str:
+        """Generate a response using GPT-4 with the retrieved context."""
+        messages = self.build_messages(query, context, session_id)
+        with telemetry.span("completion"):
+            response = self.client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                **COMPLETION_OPTIONS
+            )
+        telemetry.record_usage("completion", CHAT_MODEL, response.usage)
         
         return response.choices[0].message.content
+
+    def stream_response(self, query: str, context: str, session_id: Optional[str] = None) -> Iterator[str]:
+        """Generate a response like generate_response, yielding text deltas as they arrive."""
+        messages = self.build_messages(query, context, session_id)
+        with telemetry.span("completion"):
+            start = time.perf_counter()
+            stream = self.client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=messages,
+                **COMPLETION_OPTIONS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            first = True
+            for chunk in stream:
+                # The usage-only chunk at the end has no choices
+                if not chunk.choices:
+                    telemetry.record_usage("completion", CHAT_MODEL, chunk.usage)
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first:
+                        telemetry.observe("time_to_first_token_seconds", time.perf_counter() - start)
+                        first = False
+                    yield delta
     
-    def chat(self, query: str) -> str:
-        """Main chat method that combines retrieval and generation."""
-        # Get relevant products
-        relevant_products = self.get_relevant_products(query)
-        # Format product information
-        context = self.format_product_info(relevant_products)
-
-
-        # Generate SQL query
-        sql_chatbot = CheeseSQLChatbot()
-        sql_response = sql_chatbot.chat(query)
-        print("sql")
-        print(sql_response)
-        if sql_response != "No one":
-            print(sql_response)
-            context = sql_response
-        # Generate response
-        response = self.generate_response(query, context)
-        # Update conversation history
-        self.conversation_history.append({"role": "user", "content": query})
-        self.conversation_history.append({"role": "assistant", "content": response})
-        
-        # Keep only last 10 exchanges
-        if len(self.conversation_history) > 10:
-            self.conversation_history = self.conversation_history[-10:]
+    def get_sql_results(self, query: str) -> SQLResult:
+        """Run the text-to-SQL branch for the query."""
+        return self.sql_chatbot.lookup(query)
+
+    def _collect(self, task: _Branch, timeout: float, branch: str, default: Any) -> Any:
+        """Wait for a retrieval branch until its timeout, falling back to a default."""
+        try:
+            return task.result(timeout)
+        except FutureTimeoutError:
+            logger.warning("%s retrieval timed out", branch)
+            telemetry.increment("retrieval_timeouts_total", branch=branch.lower())
+        except Exception:
+            logger.exception("%s retrieval failed", branch)
+        return default
+
+    def plan(self, query: str) -> RetrievalPlan:
+        """Decide which retrieval branches to run for the query."""
+        if RETRIEVAL_PLANNER == "off":
+            return RetrievalPlan()
+        return plan_retrieval(query)
+
+    def retrieve(self, query: str) -> Retrieval:
+        """Run the planned vector and SQL lookups side by side and fuse their results."""
+        with telemetry.span("retrieval"):
+            plan = self.plan(query)
+            for branch, enabled in (("vector", plan.vector), ("sql", plan.sql)):
+                if not enabled:
+                    telemetry.increment("retrieval_skipped_total", branch=branch)
+
+            vector_task = _Branch(self.executor, self.get_relevant_products, query) if plan.vector else None
+            sql_task = _Branch(self.executor, self.get_sql_results, query) if plan.sql else None
+
+            vector_matches = self._collect(vector_task, VECTOR_TIMEOUT, "Vector", []) if vector_task else []
+            sql_result = self._collect(sql_task, SQL_TIMEOUT, "SQL", None) if sql_task else None
+        return self.fuse(vector_matches, sql_result, plan)
+
+    def fuse(self, vector_matches: List[Any], sql_result: Optional[SQLResult], plan: RetrievalPlan) -> Retrieval:
+        """Merge both branches into one ranking with reciprocal rank fusion.
+
+        SQL product rows and vector matches are keyed by product id, so a
+        product found by both ranks above one found by either alone; SQL
+        rows that are not products are kept alongside.
+        """
+        sql_matches, rows = [], []
+        if sql_result is not None and sql_result.ok:
+            for row in sql_result.rows:
+                match = row_match(row)
+                if match is None:
+                    rows.append(row)
+                else:
+                    sql_matches.append(match)
+        products = reciprocal_rank_fusion([sql_matches, vector_matches], top_k=None)
+        return Retrieval(products, rows, sql_result, plan)
+
+    def merge_context(self, retrieval: Retrieval) -> str:
+        """Render a fused retrieval as a single budgeted context."""
+        return self.context_builder.build(retrieval.rows, retrieval.products)
+
+    def refresh_catalog(self):
+        """Start swapping to a newly published catalog artifact, if there is one.
+
+        Checks CURRENT at most once per ARTIFACT_CHECK_INTERVAL. The new
+        version is opened and warmed on a background thread while turns keep
+        using the current one, then each component is swapped in with a
+        single assignment.
+        """
+        if self.watcher is None:
+            return
+        version = self.watcher.poll()
+        if version is None:
+            return
+        with self._swap_lock:
+            if self._swapping:
+                return
+            self._swapping = True
+        threading.Thread(target=self._swap_catalog, args=(version,), name="catalog-swap", daemon=True).start()
+
+    def _swap_catalog(self, version: str):
+        try:
+            with telemetry.span("catalog_swap"):
+                catalog = CatalogVersion.open(version, self.watcher.root)
+                lookup = ProductLookup.from_json(catalog.catalog_path)
+                retriever = make_retriever(catalog=catalog) if VECTOR_BACKEND != "pinecone" else self.retriever
+                if isinstance(retriever, LocalVectorIndex):
+                    retriever.warm()
+                self.sql_chatbot.use_database(catalog.database_path)
+                self.retriever, self.lookup, self.catalog = retriever, lookup, catalog
+            self.watcher.version = version
+            telemetry.increment("catalog_swaps_total")
+            logger.info("switched to catalog version %s", version)
+        except Exception:
+            logger.exception("loading catalog version %s failed; keeping the current one", version)
+        finally:
+            self._swapping = False
+
+    def catalog_version(self) -> Tuple[Any, ...]:
+        """Identifies the catalog data answers were built from; cached answers expire when it changes."""
+        if self.catalog is not None:
+            return (self.sql_chatbot.schema_fingerprint, self.catalog.version)
+        stats = []
+        for path in (CATALOG_PATH, LOCAL_INDEX_PATH):
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stats.append(None)
+        return (self.sql_chatbot.schema_fingerprint, *stats)
+
+    def standalone(self, query: str, session_id: Optional[str] = None) -> bool:
+        """Whether the answer to query cannot depend on earlier turns."""
+        return self.memory_for(session_id).is_empty() or not FOLLOW_UP_PATTERN.search(query)
+
+    def cached_answer(self, query: str, session_id: Optional[str] = None) -> Optional[Tuple[str, List[Any]]]:
+        """A cached (response, products) for a standalone question, if any.
+
+        The exact question text is tried first. The embedding is only
+        computed when retrieval would compute it anyway, and retrieval then
+        reuses it, so a miss costs nothing extra; otherwise only the exact
+        text is matched.
+        """
+        if not answer_cache.maxsize or not self.standalone(query, session_id):
+            return None
+        with telemetry.span("answer_cache"):
+            version = self.catalog_version()
+            cached = answer_cache.get(query, version, record_miss=False)
+            if cached is None:
+                vector = self.embed_query(query) if self.needs_embedding(query) else None
+                cached = answer_cache.get(query, version, vector)
+            return cached
+
+    def needs_embedding(self, query: str) -> bool:
+        """Whether retrieval would embed the query: the vector branch runs and full-text search does not answer it first."""
+        if not self.plan(query).vector:
+            return False
+        return TEXT_SEARCH_MODE != "first" or not self.get_text_matches(query, top_k=1, match_all=True)
+
+    def remember_answer(self, query: str, response: str, products: List[Any]):
+        """Cache an answer generated without any conversation history."""
+        # Reuse the embedding from retrieval; never pay for one just to cache
+        vector = clients.embedding_cache.get(EMBEDDING_MODEL, query)
+        answer_cache.set(query, self.catalog_version(), (response, products), vector)
+
+    def prepare(self, query: str, session_id: Optional[str] = None) -> Tuple[Optional[str], str, List[Dict[str, Any]]]:
+        """Route, answer from the cache, or retrieve for a turn.
+
+        Returns (answer, context, products); answer is set when the router
+        or the answer cache resolved the query and no completion is needed.
+        """
+        self.refresh_catalog()
+        with telemetry.span("route"):
+            route = self.lookup.route(query)
+        if route is not None:
+            telemetry.increment("routed_total", kind=route.kind, direct=route.answer is not None)
+            return route.answer, self.format_product_info(route.matches), route.matches
+
+        cached = self.cached_answer(query, session_id)
+        if cached is not None:
+            response, products = cached
+            return response, "", products
+
+        # Retrieve from the vector index and SQLite concurrently
+        retrieval = self.retrieve(query)
+        return None, self.merge_context(retrieval), retrieval.products
+
+    def chat(self, query: str, session_id: Optional[str] = None) -> str:
+        """Main chat method that combines retrieval and generation.
+
+        Turns with the same session_id share a conversation; without one the
+        chatbot's default conversation is used.
+        """
+        with telemetry.span("chat"):
+            answer, context, relevant_products = self.prepare(query, session_id)
+
+            # Generate response
+            if answer is not None:
+                response = answer
+            else:
+                response = self.generate_response(query, context, session_id)
+                if self.memory_for(session_id).is_empty():
+                    self.remember_answer(query, response, relevant_products)
+            self.update_history(query, response, session_id)
         
         return [response,relevant_products]
+
+    def chat_stream(self, query: str, session_id: Optional[str] = None) -> Iterator[Union[str, Dict[str, Any]]]:
+        """Streaming variant of chat.
+
+        Yields the answer as text deltas, then a final dict with the full
+        "response" and the "products" retrieved for it.
+        """
+        with telemetry.span("chat", stream=True):
+            answer, context, relevant_products = self.prepare(query, session_id)
+
+            parts = []
+            deltas = [answer] if answer is not None else self.stream_response(query, context, session_id)
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+            response = "".join(parts)
+            if answer is None and self.memory_for(session_id).is_empty():
+                self.remember_answer(query, response, relevant_products)
+            self.update_history(query, response, session_id)
+
+        yield {"response": response, "products": relevant_products}
+
+    def update_history(self, query: str, response: str, session_id: Optional[str] = None):
+        """Record a finished exchange in the conversation history."""
+        memory = self.memory_for(session_id)
+        memory.add(query, response)
+        if session_id is not None:
+            self.sessions.save(session_id, memory)
     
-    def clear_history(self):
+    def clear_history(self, session_id: Optional[str] = None):
         """Clear the conversation history."""
-        self.conversation_history = []
+        if session_id is None:
+            self.memory.clear()
+        else:
+            self.sessions.clear(session_id)
 
 def main():
+    configure_logging()
     # Initialize the chatbot
     chatbot = FoodChatbot()
     
@@ -1,160 +1,417 @@
 import os
 import json
 import sqlite3
-from typing import List, Dict, Any
-from openai import OpenAI
-from dotenv import load_dotenv
+import hashlib
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+from .cache import LRUCache, normalize_text
+from .config import CHAT_MODEL, clients
+from .db import ConnectionPool, enable_wal
+from .context_builder import ContextBuilder
+from .telemetry import telemetry, cache_collector, configure_logging
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+logger = logging.getLogger(__name__)
 
 # Configuration
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-CHAT_MODEL = os.getenv("CHAT_MODEL")
+SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "4"))
+SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "512"))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "86400")) or None
+# Sampling settings for text-to-SQL, shared by the sync and async bots
+SQL_COMPLETION_OPTIONS = {"temperature": 0.3, "max_tokens": 150}
+
+SQL_SYSTEM_PROMPT = """You are a SQL query generator. Convert the user's question about cheese or cheese products into a valid SQL query.
+        The database has a 'products' table with columns: id, name, category, price, lb_price, brand, upc, sku, weight, case_size, case_price.
+        Pairings live in 'related_products' and similar items in 'similar_products', both with columns: product_id (references products.id), position, name, sku.
+        Extra pictures live in 'product_images' with columns: product_id, position, url.
+        And cheese category can be 'Cheese Wheel', 'Cream Cheese', 'Crumbled, Cubed, Grated, Shaved','Sliced Cheese','Shredded Cheese', 'Cottage Cheese' or 'Cheese Loaf'.
+        Return ONLY the SQL query without any explanation, markdown formatting, or backticks."""
+
+# Question -> validated SQL, shared by every CheeseSQLChatbot in the process.
+# Keys include a fingerprint of the prompt, schema and categories, so changing
+# any of them stops old translations from being served.
+sql_cache = LRUCache(maxsize=SQL_CACHE_SIZE, ttl=SQL_CACHE_TTL)
+telemetry.add_collector(cache_collector("sql", sql_cache))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    category TEXT,
+    price REAL,
+    lb_price REAL,
+    brand TEXT,
+    upc TEXT,
+    sku TEXT,
+    weight REAL,
+    product_url TEXT,
+    image_url TEXT,
+    case_size INTEGER,
+    case_price REAL
+);
+CREATE TABLE IF NOT EXISTS related_products (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    sku TEXT,
+    PRIMARY KEY (product_id, position)
+);
+CREATE TABLE IF NOT EXISTS similar_products (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    sku TEXT,
+    PRIMARY KEY (product_id, position)
+);
+CREATE TABLE IF NOT EXISTS product_images (
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (product_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_products_category_price ON products(category, price);
+CREATE INDEX IF NOT EXISTS idx_products_brand ON products(brand);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products(price);
+CREATE INDEX IF NOT EXISTS idx_products_lb_price ON products(lb_price);
+CREATE INDEX IF NOT EXISTS idx_products_sku ON products(sku);
+CREATE INDEX IF NOT EXISTS idx_related_products_sku ON related_products(sku);
+CREATE INDEX IF NOT EXISTS idx_similar_products_sku ON similar_products(sku);
+'''
+
+# Full-text index over the product columns people type, ranked with BM25.
+# External content keeps the text in products; the loader rebuilds it.
+FTS_SCHEMA = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, brand, category, sku, upc,
+    content='products', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+'''
+# BM25 column weights for name, brand, category, sku, upc
+FTS_WEIGHTS = (10.0, 4.0, 2.0, 8.0, 8.0)
+
+# Words that carry no product signal in questions
+STOPWORDS = frozenset("""
+a an and any are can cheese cheeses do does for have i in is it kind kinds me
+my of on or please show some tell the there this to what which with you your
+""".split())
+
+def fts_query(text: str, match_all: bool = False) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression of quoted prefix terms."""
+    terms = [t for t in re.findall(r"\w+", text.lower()) if t not in STOPWORDS]
+    if not terms:
+        return None
+    return (" AND " if match_all else " OR ").join(f'"{t}"*' for t in dict.fromkeys(terms))
+
+# Columns added to products after the original flat table, for in-place upgrades
+ADDED_PRODUCT_COLUMNS = {"case_size": "INTEGER", "case_price": "REAL"}
+
+# Related product names end with their SKU, e.g. "Pepperoni, Sliced, Layflat, Classic 124721"
+TRAILING_SKU = re.compile(r"(\d{5,})\s*$")
+
+def _trailing_sku(name: str):
+    match = TRAILING_SKU.search(name)
+    return match.group(1) if match else None
+
+def _change_key(product: Dict[str, Any]) -> str:
+    # How scraper.diff_catalogs names a record
+    sku = product.get('SKU_number', product.get('SKU'))
+    return str(sku) if sku is not None else product.get('product_url', '')
+
+@dataclass
+class SQLResult:
+    """Outcome of one text-to-SQL lookup; error is set instead of raising."""
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    sql: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
 
 class CheeseSQLChatbot:
-    def __init__(self, db_path: str = "./fixture/cheese_database.db"):
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
+    """Text-to-SQL lookup over the product catalog.
+
+    Meant to be long-lived: queries run on a pool of read-only connections,
+    and an OpenAI client can be passed in to share its HTTP connection pool.
+    With read_only set the database must already be built (e.g. a catalog
+    artifact) and is never written to.
+    """
+
+    def __init__(self, db_path: str = "./fixture/cheese_database.db", client: Optional["OpenAI"] = None, pool_size: int = SQL_POOL_SIZE,
+                 read_only: bool = False):
+        self._client = client
         self.db_path = db_path
-        self.conversation_history = []
-        self._initialize_database()
+        if not read_only:
+            self._initialize_database()
+        self.pool = ConnectionPool(db_path, size=pool_size, read_only=True)
+        if read_only:
+            self.fts_enabled = self._has_fts(self.pool)
+        self.context_builder = ContextBuilder()
+        self.schema_fingerprint = self._compute_schema_fingerprint()
     
     def _initialize_database(self):
-        """Initialize the SQLite database and create tables if they don't exist."""
+        """Initialize the SQLite database and create tables and indexes if they don't exist."""
         conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Create products table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            category TEXT,
-            price REAL,
-            lb_price REAL,
-            brand TEXT,
-            upc TEXT,
-            sku TEXT,
-            weight REAL,
-            product_url TEXT,
-            image_url TEXT
-        )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        try:
+            # Upgrade a database created with the original flat products table
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+            if columns:
+                for column, column_type in ADDED_PRODUCT_COLUMNS.items():
+                    if column not in columns:
+                        conn.execute(f"ALTER TABLE products ADD COLUMN {column} {column_type}")
+            conn.executescript(SCHEMA)
+            self.fts_enabled = self._initialize_fts(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        enable_wal(self.db_path)
+
+    def _initialize_fts(self, conn: sqlite3.Connection) -> bool:
+        """Create the FTS5 index, filling it from existing rows the first time."""
+        existed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+        try:
+            conn.execute(FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning("Full-text search unavailable: %s", e)
+            return False
+        if not existed:
+            conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+        return True
+
+    @property
+    def client(self) -> "OpenAI":
+        """The OpenAI client passed in, or the shared one, built on first use."""
+        return self._client or clients.openai
+
+    @staticmethod
+    def _has_fts(pool: ConnectionPool) -> bool:
+        with pool.connection() as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone() is not None
+
+    def _compute_schema_fingerprint(self, pool: Optional[ConnectionPool] = None) -> str:
+        """Hash the SQL prompt, table definitions and category list used for translation."""
+        with (pool or self.pool).connection() as conn:
+            schema = [row[0] for row in conn.execute("SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY name")]
+            categories = [row[0] for row in conn.execute("SELECT DISTINCT category FROM products ORDER BY category")]
+        digest = hashlib.sha256()
+        for part in [CHAT_MODEL or "", SQL_SYSTEM_PROMPT, *map(repr, schema), *map(repr, categories)]:
+            digest.update(part.encode('utf-8'))
+        return digest.hexdigest()
+
+    def use_database(self, db_path: str):
+        """Switch to another prebuilt database, such as a new catalog artifact.
+
+        The new pool is opened and its fingerprint computed before the swap,
+        so no query waits on it; queries already running finish on the old
+        database. Translations stay cached when the schema and categories
+        did not change.
+        """
+        pool = ConnectionPool(db_path, size=self.pool.size, read_only=True)
+        fts_enabled = self._has_fts(pool)
+        fingerprint = self._compute_schema_fingerprint(pool)
+        old_pool = self.pool
+        self.db_path, self.pool, self.fts_enabled, self.schema_fingerprint = db_path, pool, fts_enabled, fingerprint
+        old_pool.close()
+
+    def _cache_key(self, user_query: str):
+        return (self.schema_fingerprint, normalize_text(user_query))
     
-    def load_data_from_json(self, json_file: str):
-        """Load data from JSON file into SQLite database."""
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Clear existing data
-        cursor.execute("DELETE FROM products")
-        
-        # Insert new data
-        for product in data:
-            cursor.execute('''
-            INSERT INTO products (
-                name, category, price, lb_price, brand, upc, sku, weight, product_url, image_url
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+    @staticmethod
+    def _product_rows(data: List[Dict[str, Any]], first_id: int = 1):
+        """Rows for the products, related, similar and image tables, with ids from first_id."""
+        products, related, similar, images = [], [], [], []
+        for product_id, product in enumerate(data, start=first_id):
+            sku = product.get('SKU_number', product.get('SKU'))
+            upc = product.get('UPC_number', product.get('UPC'))
+            products.append((
+                product_id,
                 product.get('name'),
                 product.get('category'),
                 product.get('price'),
                 product.get('LB_price'),
                 product.get('brand'),
-                product.get('UPC'),
-                product.get('SKU'),
+                None if upc is None else str(upc),
+                None if sku is None else str(sku),
                 product.get('weight'),
                 product.get('product_url'),
-                product.get('image_url')
+                product.get('image_url'),
+                product.get('case_size'),
+                product.get('case_price')
             ))
+            for position, name in enumerate(product.get('related_products') or []):
+                related.append((product_id, position, name, _trailing_sku(name)))
+            for position, name in enumerate(product.get('like_products') or []):
+                similar.append((product_id, position, name, _trailing_sku(name)))
+            for position, url in enumerate(product.get('product_images') or []):
+                images.append((product_id, position, url))
+        return products, related, similar, images
+
+    @staticmethod
+    def _insert_rows(conn: sqlite3.Connection, rows):
+        products, related, similar, images = rows
+        conn.executemany('''
+        INSERT INTO products (
+            id, name, category, price, lb_price, brand, upc, sku, weight, product_url, image_url, case_size, case_price
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', products)
+        conn.executemany("INSERT INTO related_products (product_id, position, name, sku) VALUES (?, ?, ?, ?)", related)
+        conn.executemany("INSERT INTO similar_products (product_id, position, name, sku) VALUES (?, ?, ?, ?)", similar)
+        conn.executemany("INSERT INTO product_images (product_id, position, url) VALUES (?, ?, ?)", images)
+
+    def load_data_from_json(self, json_file: str):
+        """Load data from JSON file into SQLite database in a single transaction."""
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        rows = self._product_rows(data)
         
-        conn.commit()
-        conn.close()
-    
-    def generate_sql_query(self, user_query: str) -> str:
-        """Generate SQL query from natural language using GPT."""
-        system_prompt = """You are a SQL query generator. Convert the user's question about cheese or cheese products into a valid SQL query.
-        The database has a 'products' table with columns: name, category, price, lb_price, brand, upc, sku, weight.
-        And cheese category can be 'Cheese Wheel', 'Cream Cheese', 'Crumbled, Cubed, Grated, Shaved','Sliced Cheese','Shredded Cheese', 'Cottage Cheese' or 'Cheese Loaf'.
-        Return ONLY the SQL query without any explanation, markdown formatting, or backticks."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                # Clear existing data
+                for table in ("related_products", "similar_products", "product_images", "products"):
+                    conn.execute(f"DELETE FROM {table}")
+                self._insert_rows(conn, rows)
+                if self.fts_enabled:
+                    conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_query}
-        ]
+        # New catalog data may change the category list the cache was keyed on
+        self.schema_fingerprint = self._compute_schema_fingerprint()
+
+    def apply_changes(self, json_file: str, changes: Dict[str, List[str]]):
+        """Reload only the SKUs a scrape added, changed or removed (see scraper.diff_catalogs).
+
+        The database must hold the catalog the changes were computed
+        against; records without a SKU are keyed by product URL.
+        """
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        touched = set(changes.get("added", [])) | set(changes.get("changed", [])) | set(changes.get("removed", []))
+        if not touched:
+            return
+        data = [p for p in data if _change_key(p) in touched]
         
-        response = self.client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=messages,
-            temperature=0.3,
-            max_tokens=150
-        )
+        conn = sqlite3.connect(self.db_path)
+        try:
+            with conn:
+                conn.execute("CREATE TEMP TABLE touched (sku TEXT PRIMARY KEY)")
+                conn.executemany("INSERT INTO touched (sku) VALUES (?)", [(sku,) for sku in touched])
+                where = "sku IN (SELECT sku FROM touched) OR (sku IS NULL AND product_url IN (SELECT sku FROM touched))"
+                for table in ("related_products", "similar_products", "product_images"):
+                    conn.execute(f"DELETE FROM {table} WHERE product_id IN (SELECT id FROM products WHERE {where})")
+                conn.execute(f"DELETE FROM products WHERE {where}")
+                first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM products").fetchone()[0]
+                self._insert_rows(conn, self._product_rows(data, first_id))
+                conn.execute("DROP TABLE touched")
+                if self.fts_enabled:
+                    conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
         
-        # Clean up the SQL query by removing any markdown formatting or backticks
-        sql_query = response.choices[0].message.content.strip()
+        self.schema_fingerprint = self._compute_schema_fingerprint()
+    
+    @staticmethod
+    def sql_messages(user_query: str) -> List[Dict[str, str]]:
+        """Chat messages asking the model to translate a question to SQL."""
+        return [
+            {"role": "system", "content": SQL_SYSTEM_PROMPT},
+            {"role": "user", "content": user_query}
+        ]
+
+    @staticmethod
+    def clean_sql(content: str) -> str:
+        """Clean up the SQL query by removing any markdown formatting or backticks."""
+        sql_query = content.strip()
         sql_query = sql_query.replace('```sql', '').replace('```', '').strip()
-        print(sql_query)
+        logger.debug("generated SQL: %s", sql_query)
         return sql_query
+
+    def generate_sql_query(self, user_query: str) -> str:
+        """Generate SQL query from natural language using GPT."""
+        with telemetry.span("sql_generation"):
+            response = self.client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=self.sql_messages(user_query),
+                **SQL_COMPLETION_OPTIONS
+            )
+        telemetry.record_usage("sql_generation", CHAT_MODEL, response.usage)
+        return self.clean_sql(response.choices[0].message.content)
     
     def execute_query(self, sql_query: str) -> List[Dict[str, Any]]:
-        """Execute SQL query and return results."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(sql_query)
-            results = [dict(row) for row in cursor.fetchall()]
-            return results
-        except sqlite3.Error as e:
-            raise Exception(f"SQL Error: {str(e)}")
-        finally:
-            conn.close()
+        """Execute SQL query on a pooled read-only connection and return results."""
+        with telemetry.span("sql_execution"), self.pool.connection() as conn:
+            try:
+                cursor = conn.execute(sql_query)
+                return [dict(row) for row in cursor.fetchall()]
+            except sqlite3.Error as e:
+                raise Exception(f"SQL Error: {str(e)}")
     
+    def search_text(self, query: str, k: int = 5, match_all: bool = False) -> List[Dict[str, Any]]:
+        """Keyword search over names, brands, categories, SKUs and UPCs.
+
+        Returns up to k product rows ranked by BM25, each with a "score"
+        where higher is better. With match_all, every term must match.
+        """
+        expression = fts_query(query, match_all)
+        if not self.fts_enabled or expression is None:
+            return []
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        with telemetry.span("text_search"), self.pool.connection() as conn:
+            rows = conn.execute(f'''
+            SELECT products.*, -bm25(products_fts, {weights}) AS score
+            FROM products_fts JOIN products ON products.id = products_fts.rowid
+            WHERE products_fts MATCH ?
+            ORDER BY bm25(products_fts, {weights})
+            LIMIT ?
+            ''', (expression, k)).fetchall()
+        return [dict(row) for row in rows]
+
     def format_results(self, results: List[Dict[str, Any]]) -> str:
-        """Format query results into a readable string."""
+        """Format query results into a compact, token-budgeted table."""
         if not results:
             return "No one"
-        
-        formatted_results = []
-        for product in results:
-            info = f"Product: {product['name']}\n"
-            info += f"Category: {product['category']}\n"
-            info += f"Price: ${product['price']}\n"
-            if product['lb_price']:
-                info += f"Price per pound: ${product['lb_price']}/lb\n"
-            info += f"Brand: {product['brand']}\n"
-            info += f"Product URL: {product['product_url']}\n"
-            info += f"Image URL: {product['image_url']}\n"
-            formatted_results.append(info)
-        
-        return "\n".join(formatted_results)
-    
-    def chat(self, query: str) -> str:
-        """Main chat method that generates and executes SQL queries."""
+        return self.context_builder.build(results)
+
+    def lookup(self, query: str) -> SQLResult:
+        """Translate the question to SQL and run it, reporting failures in the result."""
+        # Reuse a previously validated translation, or generate a new one
+        key = self._cache_key(query)
+        sql_query = sql_cache.get(key)
+        cached = sql_query is not None
         try:
-            # Generate SQL query
-            sql_query = self.generate_sql_query(query)
-            
-            # Execute query
+            if not cached:
+                sql_query = self.generate_sql_query(query)
             results = self.execute_query(sql_query)
-            
-            # Format results
-            response = self.format_results(results)
-            
-            # Update conversation history
-            self.conversation_history.append({"role": "user", "content": query})
-            self.conversation_history.append({"role": "assistant", "content": response})
-            
-            return response
         except Exception as e:
-            return f"I encountered an error: {str(e)}"
+            sql_cache.pop(key)
+            logger.warning("SQL lookup failed: %s", e)
+            return SQLResult(sql=sql_query, error=str(e), cached=cached)
+        # Only queries that ran cleanly are worth caching
+        if not cached:
+            sql_cache.set(key, sql_query)
+        return SQLResult(results, sql_query, cached=cached)
+    
+    def chat(self, query: str) -> str:
+        """Main chat method that generates and executes SQL queries."""
+        result = self.lookup(query)
+        if not result.ok:
+            return f"I encountered an error: {result.error}"
+        
+        # Format results
+        return self.format_results(result.rows)
 
 def main():
+    configure_logging()
     # Initialize the chatbot
     chatbot = CheeseSQLChatbot()
     
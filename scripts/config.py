@@ -0,0 +1,96 @@
+"""Configuration and lazily created service clients.
+
+The .env file is read once, when this module is first imported. The
+OpenAI and Pinecone SDKs are imported and their clients built on first
+use, as is the shared embedding cache, so importing the chatbot modules
+is fast, needs no API keys, opens no files and never touches the network.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from pinecone import Pinecone
+
+    from .cache import EmbeddingCache
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+INDEX_NAME = os.getenv("INDEX_NAME")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+CHAT_MODEL = os.getenv("CHAT_MODEL")
+
+
+def _openai() -> "OpenAI":
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+def _pinecone() -> "Pinecone":
+    from pinecone import Pinecone
+    return Pinecone(api_key=PINECONE_API_KEY)
+
+
+def _embedding_cache() -> "EmbeddingCache":
+    from .cache import EmbeddingCache
+    return EmbeddingCache()
+
+
+def new_async_openai() -> "AsyncOpenAI":
+    """A new AsyncOpenAI client; each event loop should own its own."""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+
+
+class Clients:
+    """Process-wide service clients and the embedding cache, each built by its factory on first use.
+
+    override() swaps in replacements, such as the fakes the benchmark
+    uses; everything that asks for a client afterwards gets the override.
+    """
+
+    def __init__(self, factories: Optional[Dict[str, Callable[[], Any]]] = None):
+        self._factories = factories or {"openai": _openai, "pinecone": _pinecone, "embedding_cache": _embedding_cache}
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self._factories[name]()
+        return client
+
+    @property
+    def openai(self) -> "OpenAI":
+        return self.get("openai")
+
+    @property
+    def pinecone(self) -> "Pinecone":
+        return self.get("pinecone")
+
+    @property
+    def embedding_cache(self) -> "EmbeddingCache":
+        """Query embeddings shared by the chatbots and the loader."""
+        return self.get("embedding_cache")
+
+    def override(self, **clients: Any) -> Dict[str, Any]:
+        """Replace clients by name; returns the previous ones (None if never built) for restoring."""
+        with self._lock:
+            previous = {name: self._clients.get(name) for name in clients}
+            for name, client in clients.items():
+                if client is None:
+                    self._clients.pop(name, None)
+                else:
+                    self._clients[name] = client
+        return previous
+
+
+clients = Clients()
@@ -0,0 +1,146 @@
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Optional; fall back to a character-based estimate
+    tiktoken = None
+
+# Most tokens of product context put in a prompt, whatever retrieval returns
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Characters per token for the fallback estimate; English prose averages about four
+CHARS_PER_TOKEN = 4
+MAX_FIELD_CHARS = 120
+MAX_RELATED = 3
+
+PRODUCT_COLUMNS = ("name", "brand", "category", "price", "lb_price", "case", "sku", "upc", "url", "image", "related")
+COMPACT_COLUMNS = ("name", "brand", "price", "sku", "url")
+# Links are useless once cut, so only free-text columns are truncated
+UNTRUNCATED_COLUMNS = frozenset(("url", "image"))
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count from tiktoken when installed, otherwise a character estimate."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _metadata(item: Any) -> Dict[str, Any]:
+    # Vector matches carry fields in .metadata; SQL rows are plain dicts
+    return item.metadata if hasattr(item, "metadata") else item
+
+
+def normalize_product(item: Any) -> Optional[Dict[str, Any]]:
+    """Map a vector match or SQL row onto the context columns; None if it is not a product."""
+    data = _metadata(item)
+    if not data or not data.get("name"):
+        return None
+    case = None
+    if data.get("case_size") and data.get("case_price"):
+        case = f"{data['case_size']} for ${data['case_price']}"
+    related = data.get("related_products")
+    if isinstance(related, list):
+        related = "; ".join(related[:MAX_RELATED])
+    lb_price = data.get("lb_price", data.get("LB_price"))
+    return {
+        "name": data.get("name"),
+        "brand": data.get("brand"),
+        "category": data.get("category"),
+        "price": f"${data['price']}" if data.get("price") not in (None, "") else None,
+        "lb_price": f"${lb_price}/lb" if lb_price else None,
+        "case": case,
+        "sku": data.get("sku", data.get("SKU")),
+        "upc": data.get("upc", data.get("UPC")),
+        "url": data.get("product_url"),
+        "image": data.get("image_url"),
+        "related": related or None,
+    }
+
+
+def _cell(value: Any, truncate: bool = True) -> str:
+    if value in (None, ""):
+        return "-"
+    text = " ".join(str(value).split()).replace("|", "/")
+    if not truncate or len(text) <= MAX_FIELD_CHARS:
+        return text
+    return text[:MAX_FIELD_CHARS - 1] + "…"
+
+
+def _row(values: Iterable[Any]) -> str:
+    return " | ".join(_cell(v) for v in values)
+
+
+def _product_row(product: Dict[str, Any], columns: Tuple[str, ...]) -> str:
+    return " | ".join(_cell(product[c], c not in UNTRUNCATED_COLUMNS) for c in columns)
+
+
+class ContextBuilder:
+    """Renders retrieved products into a compact table under a hard token budget.
+
+    Products are deduplicated by SKU (or name) across sources and kept in
+    rank order; each is rendered in full if it fits, otherwise with only
+    the compact columns, and rendering stops once the budget is spent.
+    """
+
+    def __init__(self, budget_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+
+    @staticmethod
+    def dedupe(sources: Iterable[Iterable[Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split items into unique products (first occurrence wins) and non-product rows."""
+        products, other, seen = [], [], set()
+        for items in sources:
+            for item in items or []:
+                product = normalize_product(item)
+                if product is None:
+                    other.append(dict(_metadata(item)))
+                    continue
+                key = str(product["sku"] or product["name"]).lower()
+                if key not in seen:
+                    seen.add(key)
+                    products.append(product)
+        return products, other
+
+    def build(self, *sources: Iterable[Any]) -> str:
+        """Render one or more ranked result lists as a single context string."""
+        products, other = self.dedupe(sources)
+        lines: List[str] = []
+        used = 0
+
+        def fits(text: str) -> bool:
+            nonlocal used
+            cost = estimate_tokens(text) + 1
+            if used + cost > self.budget_tokens:
+                return False
+            used += cost
+            lines.append(text)
+            return True
+
+        # Aggregate SQL answers such as counts are small and answer the question directly
+        if other:
+            columns = list(other[0])
+            fits("Query results:\n" + _row(columns))
+            for i, row in enumerate(other):
+                if not fits(_row(row.get(c) for c in columns)):
+                    lines.append(f"(+{len(other) - i} more rows omitted)")
+                    break
+
+        if products:
+            if lines:
+                fits("")
+            fits("Products (" + " | ".join(PRODUCT_COLUMNS) + "; compact rows: " + " | ".join(COMPACT_COLUMNS) + "):")
+            for i, product in enumerate(products):
+                if fits(_product_row(product, PRODUCT_COLUMNS)):
+                    continue
+                if fits(_product_row(product, COMPACT_COLUMNS)):
+                    continue
+                lines.append(f"(+{len(products) - i} more products omitted)")
+                break
+
+        return "\n".join(lines)
@@ -1,22 +1,24 @@
+import hashlib
 import json
 import os
 from typing import List, Dict, Any
 import time
-from pinecone import Pinecone, ServerlessSpec
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
+from .config import PINECONE_API_KEY, INDEX_NAME, EMBEDDING_MODEL, clients
+from .ingest import Checkpoint, EmbeddingPipeline, Upserter
+from .retrievers import LocalVectorIndex, product_metadata, LOCAL_INDEX_PATH
 
 # ----- Configuration -----
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-INDEX_NAME = os.getenv("INDEX_NAME")
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+# Seconds to wait for a new Pinecone index to report ready
+INDEX_READY_TIMEOUT = float(os.getenv("INDEX_READY_TIMEOUT", "300"))
+PINECONE_DELETE_BATCH = 1000
 
-# ----- Initialize clients -----
-os.environ["OPENAI_API_KEY"] = OPENAI_API_KEY
-client = OpenAI()
+def __getattr__(name: str):
+    # The OpenAI client and embedding cache used to be built here at import; they are now shared and built on first use
+    if name == "client":
+        return clients.openai
+    if name == "embedding_cache":
+        return clients.embedding_cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ----- Functions -----
 def load_json_data(json_path: str) -> List[Dict[str, Any]]:
@@ -30,46 +32,11 @@ def load_json_data(json_path: str) -> List[Dict[str, Any]]:
     return data
 
 def generate_embeddings(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
-    """Generate embeddings using OpenAI API v1.0+."""
+    """Generate embeddings using OpenAI API v1.0+, in concurrent rate-limited batches."""
     if not texts:
         print("WARNING: No texts provided for embedding generation")
         return []
-    
-    embeddings = []
-    # Reduce batch size to avoid quota issues
-    batch_size = 50  # Reduced from 100 to 50
-    
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        print(f"Generating embeddings for batch {i//batch_size + 1}/{(len(texts)-1)//batch_size + 1}")
-        
-        max_retries = 3
-        retry_delay = 5
-        
-        for attempt in range(max_retries):
-            try:
-                response = client.embeddings.create(
-                    input=batch,
-                    model=model
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                embeddings.extend(batch_embeddings)
-                print(f"Successfully embedded {len(batch)} texts")
-                # Add a small delay between batches to avoid rate limits
-                time.sleep(1)
-                break
-                
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    print(f"Error: {str(e)}. Retrying in {retry_delay} seconds... (Attempt {attempt+1}/{max_retries})")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                else:
-                    print(f"Failed to generate embeddings after {max_retries} attempts: {str(e)}")
-                    raise
-    
-    return embeddings
+    return EmbeddingPipeline(clients.openai, model).embed(texts)
 
 def prepare_product_text(product: Dict[str, Any]) -> str:
     """Create a rich text representation of a product for embedding."""
@@ -105,20 +72,62 @@ def prepare_product_text(product: Dict[str, Any]) -> str:
     return " ".join(parts)
 
 def initialize_pinecone():
-    """Initialize Pinecone with API key."""
-    pc = Pinecone(api_key=PINECONE_API_KEY)
+    """The shared Pinecone client, built on first use."""
+    pc = clients.pinecone
     print(f"Existing indexes: {pc.list_indexes().names()}")
     return pc
 
-def check_and_recreate_index(pc, index_name: str, dimension: int, metric: str = "cosine"):
-    """Check if index exists with correct dimensions, delete and recreate if needed."""
+def content_hash(*parts: Any) -> str:
+    """Stable hash of product content, used to skip unchanged products."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def manifest_path(local_index_path: str) -> str:
+    """The manifest sits next to the local index it describes."""
+    return os.path.splitext(local_index_path)[0] + ".manifest.json"
+
+def load_manifest(path: str) -> Dict[str, Any]:
     try:
-        # Delete the index if it exists
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(path: str, manifest: Dict[str, Any]):
+    """Write the manifest atomically so an interrupted run never leaves half a file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def wait_for_index(pc, index_name: str, timeout: float = INDEX_READY_TIMEOUT):
+    """Poll until the index reports ready, backing off up to 5 seconds between checks."""
+    deadline = time.monotonic() + timeout
+    delay = 0.5
+    while not pc.describe_index(index_name).status.ready:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Index {index_name} not ready after {timeout:.0f}s")
+        time.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+def ensure_index(pc, index_name: str, dimension: int, metric: str = "cosine"):
+    """Return the index, creating it if missing or recreating it if its dimension changed.
+
+    Returns (index, created); a created index is empty and needs every vector.
+    """
+    from pinecone import ServerlessSpec
+
+    try:
+        created = False
         if index_name in pc.list_indexes().names():
-            print(f"Deleting existing index: {index_name}")
+            if pc.describe_index(index_name).dimension == dimension:
+                return pc.Index(index_name), created
+            print(f"Index {index_name} has the wrong dimension, recreating it")
             pc.delete_index(index_name)
         
-        # Create new index with correct dimensions
         print(f"Creating index: {index_name} with dimension {dimension}")
         pc.create_index(
             name=index_name,
@@ -127,93 +136,169 @@ def check_and_recreate_index(pc, index_name: str, dimension: int, metric: str =
             spec=ServerlessSpec(
                 cloud='aws',
                 region='us-east-1'
-            )
+            ),
+            timeout=-1
         )
+        created = True
         
-        # Wait for index to be ready
         print("Waiting for index to be ready...")
-        time.sleep(10)
-        
-        return pc.Index(index_name)
+        wait_for_index(pc, index_name)
+        return pc.Index(index_name), created
     except Exception as e:
         print(f"Error creating Pinecone index: {str(e)}")
         print("Please verify your Pinecone API key and account status")
         raise
+
+def checkpoint_path(local_index_path: str) -> str:
+    """Vectors embedded by an unfinished run, next to the local index."""
+    return os.path.splitext(local_index_path)[0] + ".checkpoint.db"
+
+class PineconeSync:
+    """Streams vectors whose content changed since the last sync to Pinecone.
+
+    synced maps id -> content hash as of the last sync. Changed vectors are
+    upserted as soon as their embedding is available, in parallel with the
+    rest of the run; finish() deletes removed ids and returns the new
+    mapping. With duplicate ids the last row wins, as it would in Pinecone.
+    """
+
+    def __init__(self, index, ids: List[str], metadata_list: List[Dict[str, Any]], text_hashes: List[str],
+                 vector_hashes: List[str], synced: Dict[str, str]):
+        self.index = index
+        self.metadata_list = metadata_list
+        self.latest = {product_id: j for j, product_id in enumerate(ids)}
+        self.current = {product_id: vector_hashes[j] for product_id, j in self.latest.items()}
+        changed = [product_id for product_id, h in self.current.items() if synced.get(product_id) != h]
+        self.removed = [product_id for product_id in synced if product_id not in self.current]
+        print(f"Pinecone: {len(changed)} vectors to upsert, {len(self.removed)} to delete, {len(self.current) - len(changed)} unchanged")
         
-def create_vector_db_from_food_products(json_path: str, index_name: str):
-    """Create a vector database from food product JSON data."""
+        # Changed ids grouped by the text hash whose embedding they wait for
+        self.waiting: Dict[str, List[str]] = {}
+        for product_id in changed:
+            self.waiting.setdefault(text_hashes[self.latest[product_id]], []).append(product_id)
+        self.upserter = Upserter(lambda vectors: index.upsert(vectors=vectors))
+
+    def ready(self, vectors: Dict[str, Any]):
+        """Queue upserts for every changed id whose text hash now has a vector."""
+        for text_hash, vector in vectors.items():
+            for product_id in self.waiting.pop(text_hash, []):
+                self.upserter.add({
+                    "id": product_id,
+                    "values": [float(v) for v in vector],
+                    "metadata": self.metadata_list[self.latest[product_id]]
+                })
+
+    def finish(self) -> Dict[str, str]:
+        if self.waiting:
+            raise RuntimeError(f"{len(self.waiting)} changed vectors were never embedded")
+        self.upserter.close()
+        for i in range(0, len(self.removed), PINECONE_DELETE_BATCH):
+            self.index.delete(ids=self.removed[i:i + PINECONE_DELETE_BATCH])
+        print(f"Upserted {self.upserter.count} vectors, deleted {len(self.removed)}")
+        return self.current
+
+def create_vector_db_from_food_products(json_path: str, index_name: str, local_index_path: str = LOCAL_INDEX_PATH,
+                                        use_pinecone: bool = True, full_rebuild: bool = False):
+    """Create or incrementally refresh the vector database from food product JSON data.
+
+    Each product's embedding text is hashed; only texts not embedded by a
+    previous run are sent to the embedding API, the rest reuse vectors from
+    the existing local index. The local NumPy index is always rewritten;
+    Pinecone, when use_pinecone is set, only receives changed vectors and
+    deletions. full_rebuild ignores the manifest and re-embeds everything.
+    """
     # Load data
     print(f"Loading JSON data from {json_path}...")
     data = load_json_data(json_path)
     print(f"Loaded {len(data)} product records")
     
     # Prepare text for embedding
-    print("Preparing product text for embedding...")
     product_texts = [prepare_product_text(product) for product in data]
-    print(f"Created {len(product_texts)} text descriptions")
+    text_hashes = [content_hash(text) for text in product_texts]
+    ids = [f"product_{product.get('SKU_number', i)}" for i, product in enumerate(data)]
+    metadata_list = [product_metadata(product) for product in data]
+    
+    # Vectors from the last run, keyed by the hash of the text they embed.
+    # Stored rows are normalized, which leaves cosine scores unchanged.
+    manifest_file = manifest_path(local_index_path)
+    manifest = {} if full_rebuild else load_manifest(manifest_file)
+    previous = {}
+    if manifest.get("model") == EMBEDDING_MODEL and LocalVectorIndex.exists(local_index_path):
+        previous_index = LocalVectorIndex.load(local_index_path)
+        if len(previous_index) == len(manifest.get("rows", [])):
+            previous = {h: previous_index.matrix[row] for row, h in enumerate(manifest["rows"])}
+    
+    # Embed only new or changed texts; a failed run leaves its vectors in the checkpoint
+    missing = sorted({h: j for j, h in enumerate(text_hashes) if h not in previous}.values())
+    print(f"{len(missing)} of {len(data)} product texts need embedding, the rest reuse earlier vectors")
+    checkpoint = Checkpoint(checkpoint_path(local_index_path)) if missing else None
+    pipeline = EmbeddingPipeline(clients.openai, EMBEDDING_MODEL, checkpoint=checkpoint)
+    
+    pc, sync = None, None
     
-    # Generate embeddings
-    print("Generating embeddings...")
-    embeddings = generate_embeddings(product_texts)
+    def start_sync(dimension: int):
+        # Pinecone is tracked separately: it may be behind a local-only run
+        nonlocal pc, sync
+        print("Initializing Pinecone...")
+        pc = initialize_pinecone()
+        print(f"Setting up index '{index_name}'...")
+        index, created = ensure_index(pc, index_name, dimension)
+        synced = manifest.get("pinecone", {})
+        if created or synced.get("index") != index_name or synced.get("model") != EMBEDDING_MODEL:
+            synced = {}
+        vector_hashes = [content_hash(h, metadata) for h, metadata in zip(text_hashes, metadata_list)]
+        sync = PineconeSync(index, ids, metadata_list, text_hashes, vector_hashes, synced.get("vectors", {}))
+        sync.ready(previous)
+    
+    # Upserts start as soon as the index dimension is known, overlapping with embedding
+    if use_pinecone and previous:
+        start_sync(len(next(iter(previous.values()))))
+    fresh = {}
+    for keys, vectors in pipeline.stream([text_hashes[j] for j in missing], [product_texts[j] for j in missing]):
+        batch = dict(zip(keys, vectors))
+        fresh.update(batch)
+        print(f"Embedded {len(fresh)}/{len(missing)} texts")
+        if use_pinecone:
+            if sync is None:
+                start_sync(len(vectors[0]))
+            sync.ready(batch)
+    embeddings = [fresh[h] if h in fresh else previous[h].tolist() for h in text_hashes]
     
     if not embeddings:
         raise ValueError("Failed to generate embeddings")
     
     dimension = len(embeddings[0])
-    print(f"Generated embeddings with dimension {dimension}")
-    
-    # Initialize Pinecone
-    print("Initializing Pinecone...")
-    pc = initialize_pinecone()
     
-    # Create or connect to index - with correct dimensions
-    print(f"Setting up index '{index_name}'...")
-    index = check_and_recreate_index(pc, index_name, dimension)
-    
-    # Prepare metadata and IDs
-    print("Preparing metadata and IDs...")
-    ids = [f"product_{product.get('SKU_number', i)}" for i, product in enumerate(data)]
+    # Build the local index
+    print(f"Saving local vector index to {local_index_path}...")
+    local_index = LocalVectorIndex.build(ids, embeddings, metadata_list, model=EMBEDDING_MODEL)
+    local_index.save(local_index_path)
+    manifest.update({"model": EMBEDDING_MODEL, "dimension": dimension, "rows": text_hashes})
     
-    # Prepare metadata
-    metadata_list = []
-    for product in data:
-        metadata = {
-            "name": product.get("name", ""),
-            "category": product.get("category", ""),
-            "price": float(product.get("price", 0)),
-            "LB_price": float(product.get("LB_price", 0)),
-            "SKU": str(product.get("SKU_number", "")),
-            "UPC": str(product.get("UPC_number", "")),
-            "brand": str(product.get("brand", "")),
-            "product_url": str(product.get("product_url","")),
-            "image_url": str(product.get("image_url", "")),
-            "related_products": (product.get("related_products", "")),
-            "weight": float(product.get("weight", ""))
-        }
-        metadata_list.append(metadata)
-    
-    # Insert vectors in batches
-    print("Inserting vectors into Pinecone...")
-    batch_size = 100
-    for i in range(0, len(embeddings), batch_size):
-        end_idx = min(i + batch_size, len(embeddings))
-        batch_vectors = [
-            {"id": ids[j], 
-             "values": embeddings[j], 
-             "metadata": metadata_list[j]
-            } for j in range(i, end_idx)
-        ]
-        
-        index.upsert(vectors=batch_vectors)
-        print(f"Inserted batch {i//batch_size + 1}/{(len(embeddings)-1)//batch_size + 1}")
+    if sync is not None:
+        manifest["pinecone"] = {"index": index_name, "model": EMBEDDING_MODEL, "vectors": sync.finish()}
+    save_manifest(manifest_file, manifest)
+    if checkpoint is not None:
+        checkpoint.remove()
     
-    print(f"Successfully created vector database with {len(embeddings)} product vectors")
-    return pc, index
+    if not use_pinecone:
+        print(f"Successfully created local vector index with {len(local_index)} product vectors")
+        return None, local_index
+    print(f"Successfully synced vector database with {len(local_index)} product vectors")
+    return pc, pc.Index(index_name)
 
 def query_product_database(pc, index_name, query_text: str, top_k: int = 5):
-    """Query the product database with text."""
-    # Generate embedding for the query
-    query_embedding = generate_embeddings([query_text])[0]
+    """Query the product database with text and return the matches.
+
+    Pass pc=None to search the local index at index_name instead of Pinecone.
+    """
+    # Generate embedding for the query, or reuse a cached one
+    query_embedding = clients.embedding_cache.get_or_create(
+        EMBEDDING_MODEL, query_text, lambda: generate_embeddings([query_text])[0]
+    )
+    
+    if pc is None:
+        return LocalVectorIndex.load(index_name).query(query_embedding, top_k=top_k)
     
     # Get the index
     index = pc.Index(index_name)
@@ -225,21 +310,22 @@ def query_product_database(pc, index_name, query_text: str, top_k: int = 5):
         include_metadata=True
     )
     
-    return results
+    return results.matches
 
 # ----- Main execution -----
 def main():
     # Path to your JSON file
     json_path = "fixture/cheese_data.json"  # Update with your file path
     
-    # Create the vector database
-    pc, index = create_vector_db_from_food_products(json_path, INDEX_NAME)
+    # Create the vector database, locally and in Pinecone when configured
+    use_pinecone = bool(PINECONE_API_KEY)
+    pc, index = create_vector_db_from_food_products(json_path, INDEX_NAME, use_pinecone=use_pinecone)
     
     # Example query
-    results = query_product_database(pc, INDEX_NAME, "mozzarella cheese for pizza")
+    results = query_product_database(pc, INDEX_NAME if use_pinecone else LOCAL_INDEX_PATH, "mozzarella cheese for pizza")
     
     print("\nSearch Results for 'mozzarella cheese for pizza':")
-    for i, match in enumerate(results.matches):
+    for i, match in enumerate(results):
         print(f"\n{i+1}. {match.metadata.get('name', 'No name')}")
         print(f"   Category: {match.metadata.get('category', 'N/A')}")
         print(f"   Price: ${match.metadata.get('price', 'N/A')}")
@@ -0,0 +1,349 @@
+"""Concurrent crawler for the shop's cheese department.
+
+Listing pages are plain HTML and are fetched over HTTP; product pages are
+rendered by JavaScript and are loaded in a pool of headless Chrome
+workers that wait until the fields we parse are on the page, instead of
+sleeping a fixed time. Every request goes through a per-host politeness
+limit (rate, concurrency and robots.txt) and transient failures are
+retried with backoff.
+"""
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+from .ingest import RETRYABLE_STATUS, TokenBucket, parse_duration
+from .parsers import ParseError, parse_listing, parse_product
+from .telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = "https://shop.kimelo.com/department/cheese/3365"
+USER_AGENT = os.getenv("CRAWL_USER_AGENT", "cheese-chatbot-crawler/1.0")
+# Product pages loaded at once; one browser per worker
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "4"))
+# Requests per minute and requests in flight allowed per host
+CRAWL_HOST_RPM = float(os.getenv("CRAWL_HOST_RPM", "120"))
+CRAWL_HOST_CONCURRENCY = int(os.getenv("CRAWL_HOST_CONCURRENCY", "4"))
+CRAWL_MAX_RETRIES = int(os.getenv("CRAWL_MAX_RETRIES", "3"))
+# Seconds a page may take to load and render
+CRAWL_PAGE_TIMEOUT = float(os.getenv("CRAWL_PAGE_TIMEOUT", "20"))
+# Listing pages are read until one comes back empty, up to this many
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "50"))
+# "browser" renders product pages in Chrome; "http" fetches them as served
+CRAWL_FETCHER = os.getenv("CRAWL_FETCHER", "browser")
+
+# A product page is ready once its table and prices have rendered
+DETAIL_READY_SELECTORS = ("table.chakra-table tbody tr", "div.css-1811skr div.css-1ktp5rg b")
+
+
+class FetchError(Exception):
+    """A page could not be fetched; status is the HTTP status when there was one."""
+
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+@dataclass
+class Page:
+    """An HTTP response; status 304 means the validators sent still match."""
+    url: str
+    status: int
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+    @property
+    def body_hash(self) -> str:
+        return hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+
+
+class Politeness:
+    """Per-host request rate, concurrency cap and robots.txt rules."""
+
+    def __init__(self, rpm: float = CRAWL_HOST_RPM, concurrency: int = CRAWL_HOST_CONCURRENCY,
+                 user_agent: str = USER_AGENT, robots: bool = True):
+        self.rpm = rpm
+        self.concurrency = concurrency
+        self.user_agent = user_agent
+        self.robots = robots
+        self._hosts: Dict[str, Tuple[TokenBucket, threading.BoundedSemaphore, Optional[RobotFileParser]]] = {}
+        self._lock = threading.Lock()
+
+    def _load_robots(self, root: str) -> Optional[RobotFileParser]:
+        try:
+            response = requests.get(f"{root}/robots.txt", timeout=CRAWL_PAGE_TIMEOUT, headers={"User-Agent": self.user_agent})
+        except requests.RequestException as e:
+            logger.warning("could not read %s/robots.txt: %s", root, e)
+            return None
+        if response.status_code != 200:
+            return None
+        parser = RobotFileParser()
+        parser.parse(response.text.splitlines())
+        return parser
+
+    def _host(self, url: str):
+        parts = urlsplit(url)
+        root = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            host = self._hosts.get(root)
+        if host is not None:
+            return host
+        robots = self._load_robots(root) if self.robots else None
+        rpm = self.rpm
+        delay = robots.crawl_delay(self.user_agent) if robots else None
+        if delay:
+            rpm = min(rpm, 60.0 / float(delay))
+        with self._lock:
+            return self._hosts.setdefault(root, (TokenBucket(rpm), threading.BoundedSemaphore(self.concurrency), robots))
+
+    @contextmanager
+    def slot(self, url: str):
+        """Wait for the host's rate limit and a free connection slot."""
+        bucket, semaphore, robots = self._host(url)
+        if robots is not None and not robots.can_fetch(self.user_agent, url):
+            raise FetchError(f"disallowed by robots.txt: {url}", status=403)
+        with semaphore:
+            bucket.acquire()
+            yield
+
+    def pause(self, url: str, seconds: float):
+        """Back off the whole host, e.g. after a 429."""
+        self._host(url)[0].pause(seconds)
+
+
+class HttpFetcher:
+    """Fetches pages as served, one requests.Session per thread."""
+
+    def __init__(self, user_agent: str = USER_AGENT, timeout: float = CRAWL_PAGE_TIMEOUT):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = self.user_agent
+        return session
+
+    def get(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Page:
+        """GET, made conditional when validators from an earlier response are given."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = self._session().get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FetchError(f"{url}: {e}") from e
+        if response.status_code >= 400:
+            raise FetchError(f"{url}: HTTP {response.status_code}", response.status_code,
+                             parse_duration(response.headers.get("Retry-After")))
+        return Page(url, response.status_code, response.text if response.status_code != 304 else "",
+                    response.headers.get("ETag") or etag, response.headers.get("Last-Modified") or last_modified)
+
+    def fetch(self, url: str, ready: Sequence[str] = ()) -> str:
+        return self.get(url).text
+
+    def close(self):
+        pass
+
+
+class BrowserFetcher:
+    """Renders pages in headless Chrome, one driver per worker thread.
+
+    fetch returns as soon as every `ready` CSS selector matches an element,
+    or raises FetchError once the page timeout passes.
+    """
+
+    def __init__(self, timeout: float = CRAWL_PAGE_TIMEOUT):
+        self.timeout = timeout
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def _driver(self):
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+
+            options = Options()
+            options.add_argument("--headless")
+            options.add_argument("--no-sandbox")
+            options.add_argument("--disable-dev-shm-usage")
+            # Do not wait for images and other subresources; readiness is checked below
+            options.page_load_strategy = "eager"
+            driver = self._local.driver = webdriver.Chrome(options=options)
+            driver.set_page_load_timeout(self.timeout)
+            with self._lock:
+                self._drivers.append(driver)
+        return driver
+
+    def fetch(self, url: str, ready: Sequence[str] = ()) -> str:
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = self._driver()
+        try:
+            driver.get(url)
+            if ready:
+                WebDriverWait(driver, self.timeout).until(
+                    lambda d: all(d.find_elements(By.CSS_SELECTOR, selector) for selector in ready)
+                )
+        except TimeoutException as e:
+            raise FetchError(f"{url}: not ready after {self.timeout:.0f}s") from e
+        except WebDriverException as e:
+            raise FetchError(f"{url}: {e.msg}") from e
+        return driver.page_source
+
+    def close(self):
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                logger.warning("closing browser failed", exc_info=True)
+
+
+def make_fetcher(kind: str = CRAWL_FETCHER):
+    if kind == "http":
+        return HttpFetcher()
+    if kind == "browser":
+        return BrowserFetcher()
+    raise ValueError(f"unknown fetcher {kind!r}; expected 'browser' or 'http'")
+
+
+class Crawler:
+    """Crawls listing pages in order and product pages on a bounded worker pool."""
+
+    def __init__(self, listing_fetcher=None, detail_fetcher=None, workers: int = CRAWL_WORKERS,
+                 politeness: Optional[Politeness] = None, max_retries: int = CRAWL_MAX_RETRIES):
+        self.listing_fetcher = listing_fetcher or HttpFetcher()
+        self.detail_fetcher = detail_fetcher or make_fetcher()
+        self.workers = workers
+        self.politeness = politeness or Politeness()
+        self.max_retries = max_retries
+        self.failed: List[str] = []
+
+    def _attempt(self, url: str, call: Callable[[], Any]) -> Any:
+        """Run one fetch (and parse) under the host limits, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.politeness.slot(url), telemetry.span("crawl_fetch"):
+                    return call()
+            except (FetchError, ParseError) as e:
+                # A ParseError on a rendered page is usually a half-rendered page
+                retryable = isinstance(e, ParseError) or e.retryable
+                if attempt == self.max_retries or not retryable:
+                    raise
+                delay = getattr(e, "retry_after", None) or min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                if getattr(e, "status", None) == 429:
+                    self.politeness.pause(url, delay)
+                telemetry.increment("crawl_retries_total")
+                logger.warning("%s (retrying in %.1fs)", e, delay)
+                time.sleep(delay)
+
+    def get(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Page:
+        """A (conditional) HTTP GET through the listing fetcher, under the host limits."""
+        return self._attempt(url, lambda: self.listing_fetcher.get(url, etag, last_modified))
+
+    def listing(self, page_url: str) -> List[Dict[str, Any]]:
+        html = self._attempt(page_url, lambda: self.listing_fetcher.fetch(page_url))
+        return parse_listing(html, page_url)
+
+    def product(self, listing: Dict[str, Any], html: Optional[str] = None) -> Dict[str, Any]:
+        """The full record for a listing entry; html is the product page if already fetched."""
+        url = listing["product_url"]
+        if html is not None:
+            return parse_product(listing, html)
+        return self._attempt(url, lambda: parse_product(listing, self.detail_fetcher.fetch(url, DETAIL_READY_SELECTORS)))
+
+    def listings(self, base_url: str = BASE_URL, max_pages: int = CRAWL_MAX_PAGES,
+                 start_page: int = 1) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        """(page number, products) for each listing page until one is empty."""
+        for page_num in range(start_page, max_pages + 1):
+            products = self.listing(f"{base_url}?page={page_num}")
+            if not products:
+                return
+            yield page_num, products
+
+    def products(self, listings: Iterator[Dict[str, Any]], work: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Iterator[Any]:
+        """Full records for listing entries (or whatever `work` returns for each), in completion order.
+
+        Products whose pages keep failing are logged, added to self.failed
+        and skipped; at most 2x workers pages are queued at once.
+        """
+        listings = iter(listings)
+        work = work or self.product
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as pool:
+            inflight: Dict[Future, Dict[str, Any]] = {}
+
+            def fill():
+                while len(inflight) < self.workers * 2:
+                    entry = next(listings, None)
+                    if entry is None:
+                        return
+                    inflight[pool.submit(work, entry)] = entry
+
+            fill()
+            try:
+                while inflight:
+                    finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        entry = inflight.pop(future)
+                        try:
+                            result = future.result()
+                        except (FetchError, ParseError) as e:
+                            logger.error("skipping %s: %s", entry["product_url"], e)
+                            self.failed.append(entry["product_url"])
+                            continue
+                        yield result
+                    fill()
+            finally:
+                for future in inflight:
+                    future.cancel()
+
+    def crawl(self, base_url: str = BASE_URL, max_pages: int = CRAWL_MAX_PAGES) -> Iterator[Dict[str, Any]]:
+        """Every product in the department, each product page fetched once."""
+        seen = set()
+
+        def entries():
+            for _, products in self.listings(base_url, max_pages):
+                new = [entry for entry in products if entry["product_url"] not in seen]
+                # Past the last page the shop may repeat a page rather than return an empty one
+                if not new:
+                    return
+                for entry in new:
+                    seen.add(entry["product_url"])
+                    yield entry
+
+        return self.products(entries())
+
+    def close(self):
+        self.listing_fetcher.close()
+        self.detail_fetcher.close()
@@ -0,0 +1,96 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+from urllib.parse import quote
+
+# Prepared statements kept per connection by the sqlite3 module
+STATEMENT_CACHE_SIZE = 256
+
+
+def connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a connection usable from any thread, read-only via a mode=ro URI if asked."""
+    if read_only:
+        conn = sqlite3.connect(
+            f"file:{quote(db_path)}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def enable_wal(db_path: str):
+    """Switch the database to WAL so readers never block on the loader."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+class ConnectionPool:
+    """A fixed-size, thread-safe pool of SQLite connections.
+
+    Connections are opened lazily up to `size` and handed out one per thread
+    at a time; callers block until one is returned when all are in use.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, read_only: bool = True):
+        self.db_path = db_path
+        self.size = size
+        self.read_only = read_only
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        while True:
+            with self._lock:
+                # A closed pool no longer recycles connections, so never wait on one
+                if self._opened < self.size or self._closed:
+                    self._opened += 1
+                    return connect(self.db_path, read_only=self.read_only)
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection):
+        with self._lock:
+            if not self._closed:
+                self._idle.put(conn)
+                return
+            self._opened -= 1
+        # Checked out when the pool was closed (e.g. swapped for a new catalog)
+        conn.close()
+
+    def close(self):
+        """Close every idle connection; ones still in use are closed when returned."""
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
@@ -0,0 +1,269 @@
+"""Deterministic local stand-ins for the OpenAI and Pinecone clients.
+
+The fakes replay responses from a recording file when one matches and
+otherwise synthesize deterministic ones, sleeping for a configurable latency
+so benchmarks see realistic timings without network access. The Recording*
+wrappers sit in front of real clients to capture such a file.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+FAKE_DIMENSION = 256
+
+
+class Latency:
+    """Simulated service latency: a fixed mean in seconds with seeded jitter."""
+
+    def __init__(self, mean: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.mean = mean
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            offset = self._random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return max(0.0, self.mean + offset)
+
+    def sleep(self):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+
+
+def _key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class Recording:
+    """Recorded embeddings, completions and vector matches, saved as JSON."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.embeddings: Dict[str, List[float]] = {}
+        self.completions: Dict[str, str] = {}
+        self.matches: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            self.embeddings = data.get("embeddings", {})
+            self.completions = data.get("completions", {})
+            self.matches = data.get("matches", {})
+
+    @staticmethod
+    def embedding_key(model: str, text: str) -> str:
+        return _key(model, text)
+
+    @staticmethod
+    def completion_key(model: str, messages: List[Dict[str, str]]) -> str:
+        return _key(model, messages)
+
+    @staticmethod
+    def matches_key(vector: List[float], top_k: int) -> str:
+        return _key([round(v, 6) for v in vector], top_k)
+
+    def save(self, path: Optional[str] = None):
+        with self._lock, open(path or self.path, 'w', encoding='utf-8') as f:
+            json.dump({"embeddings": self.embeddings, "completions": self.completions, "matches": self.matches}, f)
+
+
+def synthetic_embedding(text: str, dimension: int = FAKE_DIMENSION) -> List[float]:
+    """Bag-of-words hash embedding, so texts sharing words score as similar."""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in re.findall(r"\w+", text.lower()):
+        seed = int.from_bytes(hashlib.md5(token.encode('utf-8')).digest()[:4], 'little')
+        vector += np.random.default_rng(seed).standard_normal(dimension, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
+
+
+def synthetic_completion(messages: List[Dict[str, str]]) -> str:
+    """A deterministic answer; SQL-generation prompts get a runnable query."""
+    system = messages[0]["content"] if messages else ""
+    question = messages[-1]["content"] if messages else ""
+    if "SQL query generator" in system:
+        terms = [t for t in re.findall(r"[a-z]+", question.lower()) if len(t) > 3]
+        term = terms[-1] if terms else "cheese"
+        return f"SELECT * FROM products WHERE name LIKE '%{term}%' LIMIT 5"
+    digest = hashlib.sha256(question.encode('utf-8')).hexdigest()[:8]
+    return f"Here is what I found for your question (ref {digest}). " + " ".join(["Our cheeses are great."] * 20)
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner: "FakeOpenAI"):
+        self.owner = owner
+
+    def create(self, input, model: str = None, **kwargs):
+        texts = [input] if isinstance(input, str) else list(input)
+        self.owner.embedding_latency.sleep()
+        data = []
+        for i, text in enumerate(texts):
+            vector = self.owner.recording.embeddings.get(Recording.embedding_key(model, text))
+            if vector is None:
+                vector = synthetic_embedding(text, self.owner.dimension)
+            data.append(SimpleNamespace(index=i, embedding=vector))
+        tokens = sum(len(t.split()) for t in texts)
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class _FakeCompletions:
+    def __init__(self, owner: "FakeOpenAI"):
+        self.owner = owner
+
+    def create(self, model: str = None, messages: List[Dict[str, str]] = None, stream: bool = False, **kwargs):
+        text = self.owner.recording.completions.get(Recording.completion_key(model, messages))
+        if text is None:
+            text = synthetic_completion(messages)
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        words = re.findall(r"\S+\s*", text)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(words), total_tokens=prompt_tokens + len(words))
+        # Time to first token
+        self.owner.completion_latency.sleep()
+        if stream:
+            return self._stream(words, usage)
+        time.sleep(self.owner.token_latency * len(words))
+        message = SimpleNamespace(role="assistant", content=text)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")], usage=usage)
+
+    def _stream(self, words: List[str], usage):
+        for word in words:
+            time.sleep(self.owner.token_latency)
+            delta = SimpleNamespace(content=word)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeOpenAI:
+    """Offline stand-in for openai.OpenAI covering embeddings and chat completions."""
+
+    def __init__(self, recording: Optional[Recording] = None, embedding_latency: Latency = None,
+                 completion_latency: Latency = None, token_latency: float = 0.0, dimension: int = FAKE_DIMENSION):
+        self.recording = recording or Recording()
+        self.embedding_latency = embedding_latency or Latency()
+        self.completion_latency = completion_latency or Latency()
+        self.token_latency = token_latency
+        self.dimension = dimension
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+
+class FakeAsyncOpenAI:
+    """Offline stand-in for openai.AsyncOpenAI, answering from a FakeOpenAI on worker threads."""
+
+    def __init__(self, client: Optional[FakeOpenAI] = None):
+        self.sync = client or FakeOpenAI()
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    async def _embed(self, **kwargs):
+        return await asyncio.to_thread(self.sync.embeddings.create, **kwargs)
+
+    async def _complete(self, **kwargs):
+        response = await asyncio.to_thread(self.sync.chat.completions.create, **kwargs)
+        return self._stream(response) if kwargs.get("stream") else response
+
+    @staticmethod
+    async def _stream(chunks):
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+class FakeIndex:
+    """Offline stand-in for a Pinecone index.
+
+    Replays recorded matches for a known vector and otherwise answers from an
+    in-memory retriever (typically a LocalVectorIndex over synthetic embeddings).
+    """
+
+    def __init__(self, retriever=None, recording: Optional[Recording] = None, latency: Latency = None):
+        self.retriever = retriever
+        self.recording = recording or Recording()
+        self.latency = latency or Latency()
+
+    def query(self, vector: List[float], top_k: int = 3, include_metadata: bool = True, **kwargs):
+        self.latency.sleep()
+        recorded = self.recording.matches.get(Recording.matches_key(vector, top_k))
+        if recorded is not None:
+            matches = [SimpleNamespace(**m) for m in recorded]
+        elif self.retriever is not None:
+            matches = self.retriever.query(vector, top_k=top_k)
+        else:
+            matches = []
+        return SimpleNamespace(matches=matches)
+
+    def upsert(self, vectors: List[Dict[str, Any]], **kwargs):
+        self.latency.sleep()
+        return SimpleNamespace(upserted_count=len(vectors))
+
+
+class RecordingOpenAI:
+    """Wraps a real OpenAI client and records non-streaming responses."""
+
+    def __init__(self, client, recording: Recording):
+        self.client = client
+        self.recording = recording
+        self.embeddings = SimpleNamespace(create=self._embed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _embed(self, input, model: str = None, **kwargs):
+        response = self.client.embeddings.create(input=input, model=model, **kwargs)
+        texts = [input] if isinstance(input, str) else list(input)
+        with self.recording._lock:
+            for text, item in zip(texts, response.data):
+                self.recording.embeddings[Recording.embedding_key(model, text)] = list(item.embedding)
+        return response
+
+    def _complete(self, model: str = None, messages: List[Dict[str, str]] = None, stream: bool = False, **kwargs):
+        response = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream(model, messages, response)
+        with self.recording._lock:
+            self.recording.completions[Recording.completion_key(model, messages)] = response.choices[0].message.content
+        return response
+
+    def _record_stream(self, model, messages, stream):
+        parts = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        with self.recording._lock:
+            self.recording.completions[Recording.completion_key(model, messages)] = "".join(parts)
+
+
+class RecordingIndex:
+    """Wraps a real Pinecone index and records query matches."""
+
+    def __init__(self, index, recording: Recording):
+        self.index = index
+        self.recording = recording
+
+    def query(self, vector: List[float], top_k: int = 3, **kwargs):
+        results = self.index.query(vector=vector, top_k=top_k, **kwargs)
+        with self.recording._lock:
+            self.recording.matches[Recording.matches_key(vector, top_k)] = [
+                {"id": m.id, "score": m.score, "metadata": dict(m.metadata or {})} for m in results.matches
+            ]
+        return results
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
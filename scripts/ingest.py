@@ -0,0 +1,314 @@
+"""Bulk embedding and upsert pipeline for catalog ingestion.
+
+Embedding requests run concurrently up to a fixed limit and are paced by
+request and token buckets whose rates follow the x-ratelimit-* headers the
+API returns; 429s and transient errors are retried after the Retry-After
+the server asks for. Finished vectors go to a SQLite checkpoint, so a
+failed run resumes where it stopped, and can be handed to an Upserter that
+writes to the vector store in parallel while embedding continues.
+"""
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .context_builder import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))
+# Starting limits, per minute; replaced by the ones the API reports
+EMBED_RPM = float(os.getenv("EMBED_RPM", "3000"))
+EMBED_TPM = float(os.getenv("EMBED_TPM", "1000000"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds from a rate-limit reset header such as "6m0s", "1.5s" or "20ms"."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    return sum(float(n) * _UNITS[unit] for n, unit in parts) if parts else None
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire blocks until enough tokens are available."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        # A request bigger than the whole bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = self._paused_until - now
+                if delay <= 0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def update(self, limit: Optional[float], remaining: Optional[float], reset: Optional[float]):
+        """Adopt the limit the server reports and never assume more headroom than it has left."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if limit:
+                self.capacity = limit
+                self.rate = limit / 60.0
+            if remaining is not None:
+                self.tokens = min(self.tokens, remaining)
+                if remaining <= 0 and reset:
+                    self._paused_until = max(self._paused_until, time.monotonic() + reset)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. after a 429."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0.0)
+
+
+def _header(headers: Any, name: str) -> Optional[float]:
+    value = headers.get(name) if headers is not None else None
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return parse_duration(value)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from the error's response headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    milliseconds = _header(headers, "retry-after-ms")
+    if milliseconds:
+        return milliseconds / 1000
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        seconds = _header(headers, name)
+        if seconds:
+            return seconds
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Connection errors and timeouts carry no status
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError")
+
+
+class Checkpoint:
+    """Vectors finished by an interrupted run, keyed by (model, content hash)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS vectors (
+            model TEXT NOT NULL,
+            key TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            PRIMARY KEY (model, key)
+        )
+        ''')
+        self._conn.commit()
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, List[float]]:
+        wanted = set(keys)
+        with self._lock:
+            rows = self._conn.execute("SELECT key, vector FROM vectors WHERE model = ?", (model or "",)).fetchall()
+        return {key: array('f', blob).tolist() for key, blob in rows if key in wanted}
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, List[float]]]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, key, vector) VALUES (?, ?, ?)",
+                [(model or "", key, array('f', vector).tobytes()) for key, vector in items]
+            )
+
+    def remove(self):
+        """Delete the checkpoint once its vectors are safely stored elsewhere."""
+        with self._lock:
+            self._conn.close()
+        os.remove(self.path)
+
+
+class EmbeddingPipeline:
+    """Embeds texts in concurrent, rate-limited batches."""
+
+    def __init__(self, client, model: str, batch_size: int = EMBED_BATCH_SIZE, concurrency: int = EMBED_CONCURRENCY,
+                 rpm: float = EMBED_RPM, tpm: float = EMBED_TPM, max_retries: int = EMBED_MAX_RETRIES,
+                 checkpoint: Optional[Checkpoint] = None):
+        # Retries are handled here, where they can see the shared rate limits
+        self.client = client.with_options(max_retries=0) if hasattr(client, "with_options") else client
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.checkpoint = checkpoint
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def _create(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.client.embeddings
+        raw = getattr(embeddings, "with_raw_response", None)
+        if raw is None:
+            response, headers = embeddings.create(input=texts, model=self.model), None
+        else:
+            http = raw.create(input=texts, model=self.model)
+            response, headers = http.parse(), http.headers
+        if headers is not None:
+            self.requests.update(_header(headers, "x-ratelimit-limit-requests"), _header(headers, "x-ratelimit-remaining-requests"),
+                                 parse_duration(headers.get("x-ratelimit-reset-requests")))
+            self.tokens.update(_header(headers, "x-ratelimit-limit-tokens"), _header(headers, "x-ratelimit-remaining-tokens"),
+                               parse_duration(headers.get("x-ratelimit-reset-tokens")))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """One embeddings request, paced by the buckets and retried on transient errors."""
+        cost = sum(estimate_tokens(t) for t in texts)
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire()
+            self.tokens.acquire(cost)
+            try:
+                return self._create(texts)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = _retry_after(e) or min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                if getattr(e, "status_code", None) == 429:
+                    # Everyone backs off, not just this worker
+                    self.requests.pause(delay)
+                logger.warning("embedding batch failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+
+    def _embed_keyed(self, keys: List[str], texts: List[str]) -> List[List[float]]:
+        vectors = self.embed_batch(texts)
+        # Saved from the worker, so batches finishing while the run fails are kept too
+        if self.checkpoint:
+            self.checkpoint.put_many(self.model, zip(keys, vectors))
+        return vectors
+
+    def stream(self, keys: List[str], texts: List[str]) -> Iterator[Tuple[List[str], List[List[float]]]]:
+        """Yield (keys, vectors) per finished batch, in completion order.
+
+        Keys already in the checkpoint are yielded first without a request;
+        at most 2x concurrency batches are queued at once.
+        """
+        done = self.checkpoint.get_many(self.model, keys) if self.checkpoint else {}
+        if done:
+            logger.info("resuming: %d vectors from checkpoint", len(done))
+            yield list(done), list(done.values())
+        todo = [(k, t) for k, t in zip(keys, texts) if k not in done]
+        batches = iter([todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)])
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed") as pool:
+            inflight: Dict[Future, List[str]] = {}
+
+            def fill():
+                while len(inflight) < self.concurrency * 2:
+                    batch = next(batches, None)
+                    if batch is None:
+                        return
+                    batch_keys = [k for k, _ in batch]
+                    inflight[pool.submit(self._embed_keyed, batch_keys, [t for _, t in batch])] = batch_keys
+
+            fill()
+            try:
+                while inflight:
+                    finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        batch_keys = inflight.pop(future)
+                        yield batch_keys, future.result()
+                    fill()
+            finally:
+                for future in inflight:
+                    future.cancel()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, returning vectors in input order."""
+        vectors: Dict[int, List[float]] = {}
+        keys = [str(i) for i in range(len(texts))]
+        for batch_keys, batch_vectors in self.stream(keys, texts):
+            vectors.update(zip(map(int, batch_keys), batch_vectors))
+        return [vectors[i] for i in range(len(texts))]
+
+
+class Upserter:
+    """Buffers vectors and upserts full batches on a pool of threads."""
+
+    def __init__(self, upsert: Callable[[List[Dict[str, Any]]], Any], batch_size: int = UPSERT_BATCH_SIZE,
+                 concurrency: int = UPSERT_CONCURRENCY, max_retries: int = 3):
+        self.upsert = upsert
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.count = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._futures: List[Future] = []
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upsert")
+
+    def _send(self, vectors: List[Dict[str, Any]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.upsert(vectors)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning("upsert failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+
+    def add(self, vector: Dict[str, Any]):
+        self._buffer.append(vector)
+        self.count += 1
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._futures.append(self._pool.submit(self._send, self._buffer))
+            self._buffer = []
+
+    def close(self):
+        """Send what is left and wait for every batch, raising the first failure."""
+        self.flush()
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._pool.shutdown(wait=True)
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .context_builder import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Most tokens of conversation (summary plus verbatim turns) put in a prompt
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "1500"))
+# Exchanges kept verbatim before older ones are folded into the summary
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "3"))
+# Longest a single remembered message may be; long answers are clipped
+MEMORY_MESSAGE_TOKENS = int(os.getenv("MEMORY_MESSAGE_TOKENS", "300"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "200"))
+# Evicted turns waiting for the summarizer; older ones are dropped past this
+MEMORY_PENDING_TURNS = 20
+
+Turn = Tuple[str, str]
+# (current summary, evicted turns oldest first) -> new summary
+Summarizer = Callable[[str, List[Turn]], str]
+
+
+def clip(text: str, max_tokens: int) -> str:
+    """Shorten text to roughly max_tokens, keeping the beginning."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max_tokens * CHARS_PER_TOKEN].rstrip() + " …"
+
+
+def extractive_summary(summary: str, turns: List[Turn], max_tokens: int = MEMORY_SUMMARY_TOKENS) -> str:
+    """Summary without a model call: the questions asked so far, most recent kept."""
+    questions = [q for q in summary.split("\n") if q] + [f"- {clip(user, 40)}" for user, _ in turns]
+    while len(questions) > 1 and estimate_tokens("\n".join(questions)) > max_tokens:
+        questions.pop(0)
+    return "\n".join(questions)
+
+
+class ConversationMemory:
+    """Conversation history under a token budget.
+
+    The last few exchanges are kept verbatim (each message clipped); older
+    exchanges are folded into a rolling summary. Folding runs on the given
+    executor so a turn never waits for it, and every buffer is bounded.
+    """
+
+    def __init__(self, summarizer: Optional[Summarizer] = None, executor: Optional[Executor] = None,
+                 budget_tokens: int = MEMORY_TOKEN_BUDGET, recent_turns: int = MEMORY_RECENT_TURNS,
+                 message_tokens: int = MEMORY_MESSAGE_TOKENS):
+        self.summarizer = summarizer
+        self.executor = executor
+        self.budget_tokens = budget_tokens
+        self.message_tokens = message_tokens
+        self.summary = ""
+        self.turns = deque(maxlen=recent_turns)
+        self._pending = deque(maxlen=MEMORY_PENDING_TURNS)
+        self._summarizing = False
+        # Bumped by clear() so a fold already in flight does not restore old turns
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(u) + estimate_tokens(a) for u, a in self.turns)
+
+    def add(self, query: str, response: str):
+        """Record a finished exchange, evicting the oldest ones past the budget."""
+        turn = (clip(query, self.message_tokens), clip(response, self.message_tokens))
+        with self._lock:
+            if len(self.turns) == self.turns.maxlen:
+                self._pending.append(self.turns[0])
+            self.turns.append(turn)
+            while len(self.turns) > 1 and self._tokens() > self.budget_tokens:
+                self._pending.append(self.turns.popleft())
+            start = bool(self._pending) and not self._summarizing
+            if start:
+                self._summarizing = True
+        if start:
+            if self.executor is None:
+                self._fold()
+            else:
+                self.executor.submit(self._fold)
+
+    def _fold(self):
+        """Fold pending turns into the summary until none are left."""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._summarizing = False
+                    return
+                summary, turns = self.summary, list(self._pending)
+                generation = self._generation
+                self._pending.clear()
+            try:
+                if self.summarizer is None:
+                    raise LookupError("no summarizer")
+                summary = clip(self.summarizer(summary, turns), MEMORY_SUMMARY_TOKENS)
+            except Exception as e:
+                if not isinstance(e, LookupError):
+                    logger.warning("summarizing conversation failed: %s", e)
+                summary = extractive_summary(summary, turns)
+            with self._lock:
+                if generation == self._generation:
+                    self.summary = summary
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Chat messages for the summary and the verbatim turns, oldest first."""
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        for user, assistant in turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": assistant})
+        return messages
+
+    def is_empty(self) -> bool:
+        """True before the first exchange, when no answer can depend on history."""
+        with self._lock:
+            return not (self.summary or self.turns or self._pending)
+
+    def state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot, including turns still waiting to be summarized."""
+        with self._lock:
+            return {"summary": self.summary, "turns": list(self.turns), "pending": list(self._pending)}
+
+    def restore(self, state: Dict[str, Any]):
+        """Load a snapshot taken with state(); pending turns are folded on the next add."""
+        with self._lock:
+            self.summary = state.get("summary", "")
+            self.turns.clear()
+            self.turns.extend(tuple(turn) for turn in state.get("turns", []))
+            self._pending.clear()
+            self._pending.extend(tuple(turn) for turn in state.get("pending", []))
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns.clear()
+            self._pending.clear()
+            self._generation += 1
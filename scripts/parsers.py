@@ -0,0 +1,293 @@
+"""Pure parsers for the shop's listing and product-detail pages.
+
+Each takes the page HTML and the URL it came from and returns plain
+dicts, so they can be run against saved pages without a browser.
+
+Pages are parsed with lxml and precompiled XPath expressions when lxml is
+installed, and with BeautifulSoup's pure-Python parser otherwise. Both
+backends collect the raw strings for every field in one pass over the
+page (each container is located once); the same code then turns those
+strings into a record, so the two produce identical output.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # Optional; fall back to BeautifulSoup's html.parser
+    lxml = None
+
+SITE_URL = "https://shop.kimelo.com/"
+PRICE_BOX_CLASS = "relative shadow-md border rounded-lg p-4 sticky top-[100px] css-1811skr"
+# "auto" uses lxml when installed; "lxml" or "html.parser" forces a backend
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+INT_PATTERN = re.compile(r'-?\d+')
+FLOAT_PATTERN = re.compile(r'-?\d+\.\d+|-?\d+')
+
+
+class ParseError(ValueError):
+    """Raised when a page is missing a field every product should have."""
+
+
+def extract_numbers_as_ints(text):
+    return [int(num) for num in INT_PATTERN.findall(text)]
+
+
+def extract_numbers_as_floats(text):
+    return [float(num) for num in FLOAT_PATTERN.findall(text)]
+
+
+def _first_number(text: str, floats: bool = False):
+    # Only the first number is ever used, so stop scanning there
+    match = (FLOAT_PATTERN if floats else INT_PATTERN).search(text)
+    if match is None:
+        raise ParseError(f"no number in {text!r}")
+    return float(match.group()) if floats else int(match.group())
+
+
+def _image_url(src: str, page_url: str) -> str:
+    if src.startswith('//'):
+        return 'http:' + src
+    if src.startswith('/'):
+        return urljoin(page_url, src)
+    return src
+
+
+# ----- lxml backend -----
+# Class tests mirror BeautifulSoup's: a string with spaces must equal the
+# whole class attribute, a single class must be one of its classes.
+
+def _is(cls: str) -> str:
+    return f"normalize-space(@class)='{cls}'"
+
+
+def _has(cls: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')"
+
+
+if lxml is not None:
+    _X = etree.XPath
+    X_CARDS = _X(f"//div[{_has('css-0')}]")
+    X_CARD_NAME = _X(f"(.//p[{_is('chakra-text css-pbtft')}])[1]")
+    X_CARD_BRAND = _X(f"(.//p[{_is('chakra-text css-w6ttxb')}])[1]")
+    X_CARD_LINK = _X(f"(.//a[{_is('chakra-card group css-5pmr4x')}])[1]/@href")
+    X_CARD_IMAGE = _X("(.//img)[1]/@src")
+
+    X_CATEGORIES = _X(f"//a[{_is('chakra-link chakra-breadcrumb__link css-1vtk5s8')}]")
+    X_NUMBERS = _X(f"//p[{_is('chakra-text css-0')}]")
+    X_TABLE = _X(f"(//table[{_has('chakra-table')}])[1]")
+    X_HEADERS = _X("(.//thead)[1]/descendant::tr[1]//th")
+    X_BODY = _X("(.//tbody)[1]")
+    X_ROWS = _X("descendant::tr")
+    X_CELLS = _X(".//td")
+    X_LIKE = _X(f"(//div[{_is('col-span-2 css-0')}])[1]//p[{_is('chakra-text css-pbtft')}]")
+    X_PRICE_BOX = _X(f"(//div[{_is(PRICE_BOX_CLASS)}])[1]")
+    X_PRICES = _X(f".//div[{_has('css-1ktp5rg')}]/descendant::b[{_is('chakra-text css-0')}][1]")
+    X_LB_PRICE = _X(f"(.//span[{_is('chakra-badge css-1mwp5d1')}])[1]")
+    X_RELATED = _X(f".//div[{_is('relative css-1bpq4gx')}]/descendant::p[{_is('chakra-text css-pbtft')}][1]")
+    X_IMAGES = _X(f"(//div[{_is('chakra-tabs__tablist mt-2 css-wjy2tx')}])[1]//img/@src")
+
+
+def _text(node) -> str:
+    return node.text_content().strip()
+
+
+def _lxml_tree(html: str):
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml.html.fromstring(html)
+    except ValueError:
+        # Strings carrying an XML encoding declaration must be parsed as bytes
+        return lxml.html.fromstring(html.encode('utf-8'))
+
+
+def _lxml_cards(html: str) -> List[Dict[str, Optional[str]]]:
+    root = _lxml_tree(html)
+    if root is None:
+        return []
+    cards = []
+    for item in X_CARDS(root):
+        name, brand, href, image = X_CARD_NAME(item), X_CARD_BRAND(item), X_CARD_LINK(item), X_CARD_IMAGE(item)
+        cards.append({
+            "name": _text(name[0]) if name else None,
+            "brand": _text(brand[0]) if brand else None,
+            "href": href[0] if href else None,
+            "image": image[0] if image else None,
+        })
+    return cards
+
+
+def _lxml_fields(html: str) -> Dict[str, Any]:
+    root = _lxml_tree(html)
+    if root is None:
+        return {}
+    fields: Dict[str, Any] = {
+        "categories": [_text(a) for a in X_CATEGORIES(root)],
+        "numbers": [_text(p) for p in X_NUMBERS(root)],
+        "like_products": [_text(p) for p in X_LIKE(root)],
+        "images": list(X_IMAGES(root)),
+    }
+    table = X_TABLE(root)
+    if table:
+        body = X_BODY(table[0])
+        fields["headers"] = [_text(th) for th in X_HEADERS(table[0])]
+        fields["rows"] = [[_text(td) for td in X_CELLS(tr)] for tr in X_ROWS(body[0])] if body else None
+    box = X_PRICE_BOX(root)
+    if box:
+        box = box[0]
+        lb_price = X_LB_PRICE(box)
+        fields["prices"] = [_text(b) for b in X_PRICES(box)]
+        fields["lb_price"] = _text(lb_price[0]) if lb_price else None
+        fields["related_products"] = [_text(p) for p in X_RELATED(box)]
+    return fields
+
+
+# ----- BeautifulSoup backend -----
+
+def _soup(html: str):
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, 'html.parser')
+
+
+def _soup_text(tag) -> Optional[str]:
+    return tag.text.strip() if tag is not None else None
+
+
+def _soup_cards(html: str) -> List[Dict[str, Optional[str]]]:
+    cards = []
+    for item in _soup(html).find_all('div', class_='css-0'):
+        link = item.find('a', class_="chakra-card group css-5pmr4x")
+        image = item.find('img')
+        cards.append({
+            "name": _soup_text(item.find('p', class_='chakra-text css-pbtft')),
+            "brand": _soup_text(item.find('p', class_='chakra-text css-w6ttxb')),
+            "href": link.get('href') if link is not None else None,
+            "image": image.get('src') if image is not None else None,
+        })
+    return cards
+
+
+def _soup_fields(html: str) -> Dict[str, Any]:
+    soup = _soup(html)
+    like = soup.find('div', class_='col-span-2 css-0')
+    tablist = soup.find('div', class_='chakra-tabs__tablist mt-2 css-wjy2tx')
+    fields: Dict[str, Any] = {
+        "categories": [a.text.strip() for a in soup.find_all('a', class_='chakra-link chakra-breadcrumb__link css-1vtk5s8')],
+        "numbers": [p.text.strip() for p in soup.find_all('p', class_='chakra-text css-0')],
+        "like_products": [p.text.strip() for p in like.find_all('p', class_='chakra-text css-pbtft')] if like is not None else [],
+        "images": [img['src'] for img in tablist.find_all('img') if img.get('src')] if tablist is not None else [],
+    }
+    table = soup.find('table', class_='chakra-table')
+    if table is not None:
+        thead, tbody = table.find('thead'), table.find('tbody')
+        header_row = thead.find('tr') if thead is not None else None
+        fields["headers"] = [th.text.strip() for th in header_row.find_all('th')] if header_row is not None else []
+        fields["rows"] = [[td.text.strip() for td in tr.find_all('td')] for tr in tbody.find_all('tr')] if tbody is not None else None
+    box = soup.find('div', class_=PRICE_BOX_CLASS)
+    if box is not None:
+        prices = [price.find('b', class_='chakra-text css-0') for price in box.find_all('div', class_='css-1ktp5rg')]
+        related = [product.find('p', class_='chakra-text css-pbtft') for product in box.find_all('div', class_='relative css-1bpq4gx')]
+        fields["prices"] = [b.text.strip() for b in prices if b is not None]
+        fields["lb_price"] = _soup_text(box.find('span', class_='chakra-badge css-1mwp5d1'))
+        fields["related_products"] = [p.text.strip() for p in related if p is not None]
+    return fields
+
+
+def _use_lxml() -> bool:
+    if HTML_PARSER == "html.parser":
+        return False
+    if HTML_PARSER == "lxml" and lxml is None:
+        raise ImportError("HTML_PARSER=lxml but lxml is not installed")
+    return lxml is not None
+
+
+# ----- Records -----
+
+def parse_listing(html: str, page_url: str) -> List[Dict[str, Any]]:
+    """Products on a department page: name, brand, product_url and image_url."""
+    cards = _lxml_cards(html) if _use_lxml() else _soup_cards(html)
+    products, seen = [], set()
+    for card in cards:
+        if card["name"] is None or not card["href"]:
+            continue
+        # Kept as plain concatenation so URLs (and the ids built from them) match earlier scrapes
+        product_url = SITE_URL + card["href"]
+        # Product cards sit inside other css-0 divs, so the same card is found more than once
+        if product_url in seen:
+            continue
+        seen.add(product_url)
+        data = {
+            "name": card["name"],
+            "brand": card["brand"] or "",
+            "product_url": product_url,
+        }
+        if card["image"] is not None:
+            data['image_url'] = _image_url(card["image"], page_url)
+        products.append(data)
+    return products
+
+
+def parse_detail(html: str, page_url: str) -> Dict[str, Any]:
+    """Fields from a rendered product page, to be merged into its listing entry.
+
+    Raises ParseError when the SKU, table or prices are missing, which
+    usually means the page had not finished rendering.
+    """
+    fields = _lxml_fields(html) if _use_lxml() else _soup_fields(html)
+    data: Dict[str, Any] = {}
+
+    category = fields.get("categories") or []
+    if category:
+        if category[0] == 'Cheese' and len(category) > 1:
+            data['category'] = category[1]
+        else:
+            data['category'] = category[0]
+
+    # SKU & UPC numbers
+    numbers = fields.get("numbers") or []
+    if len(numbers) < 2:
+        raise ParseError("SKU/UPC not found")
+    data['SKU_number'] = _first_number(numbers[0])
+    data['UPC_number'] = _first_number(numbers[1])
+
+    rows = fields.get("rows")
+    if rows is None:
+        raise ParseError("product table not found")
+    data['table_data'] = [fields["headers"], rows]
+    if len(rows) < 3 or not rows[2]:
+        raise ParseError("weight row not found")
+    data['weight'] = _first_number(rows[2][-1], floats=True)
+
+    data['like_products'] = fields["like_products"]
+
+    if "prices" not in fields:
+        raise ParseError("price box not found")
+    prices = [_first_number(price, floats=True) for price in fields["prices"]]
+    if not prices:
+        raise ParseError("no prices found")
+    if len(prices) == 2:
+        data['price'] = min(prices)
+        data['case_price'] = max(prices)
+        data['case_size'] = _first_number(rows[0][0])
+    else:
+        data['price'] = prices[0]
+        data['case_size'] = 1
+        data['case_price'] = prices[0]
+
+    lb_price = fields["lb_price"]
+    data['LB_price'] = _first_number(lb_price, floats=True) if lb_price is not None else 0
+    data['related_products'] = fields["related_products"]
+    data['product_images'] = [urljoin(page_url, src) for src in fields["images"]]
+    return data
+
+
+def parse_product(listing: Dict[str, Any], html: str, page_url: Optional[str] = None) -> Dict[str, Any]:
+    """A full catalog record: the listing entry plus its detail-page fields."""
+    record = dict(listing)
+    record.update(parse_detail(html, page_url or listing["product_url"]))
+    return record
@@ -0,0 +1,48 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between mtime checks; edits show up on the next call after this
+PROMPT_CHECK_INTERVAL = float(os.getenv("PROMPT_CHECK_INTERVAL", "2"))
+
+
+class PromptFile:
+    """A prompt read from disk once and re-read only when the file changes."""
+
+    def __init__(self, path: str, check_interval: float = PROMPT_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._text = None
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, mtime: int):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self._text = f.read()
+        if self._mtime is not None:
+            logger.info("reloaded prompt %s", self.path)
+        self._mtime = mtime
+
+    def get(self) -> str:
+        """Return the prompt text, reloading it if the file changed on disk."""
+        now = time.monotonic()
+        if self._text is not None and now - self._checked < self.check_interval:
+            return self._text
+        with self._lock:
+            if self._text is None or now - self._checked >= self.check_interval:
+                try:
+                    mtime = os.stat(self.path).st_mtime_ns
+                except OSError:
+                    # Keep serving the last good prompt if the file is briefly missing
+                    if self._text is None:
+                        raise
+                    logger.warning("prompt %s unavailable, keeping cached copy", self.path)
+                else:
+                    if mtime != self._mtime:
+                        self._load(mtime)
+                self._checked = now
+            return self._text
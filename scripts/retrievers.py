@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Any, Optional
+
+import numpy as np
+
+# Default location of the local vector index, next to the product fixture
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "./fixture/cheese_vectors.npy")
+
+
+@dataclass
+class Match:
+    """A scored product, shaped like a Pinecone match (id, score, metadata)."""
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _number(value: Any) -> float:
+    # Scraped records can lack a field or carry "" for it; Pinecone metadata cannot hold None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def product_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadata stored with each product vector, from a raw catalog record."""
+    return {
+        "name": product.get("name", ""),
+        "category": product.get("category", ""),
+        "price": _number(product.get("price")),
+        "LB_price": _number(product.get("LB_price")),
+        "SKU": str(product.get("SKU_number", "")),
+        "UPC": str(product.get("UPC_number", "")),
+        "brand": str(product.get("brand", "")),
+        "product_url": str(product.get("product_url","")),
+        "image_url": str(product.get("image_url", "")),
+        "related_products": (product.get("related_products", "")),
+        "weight": _number(product.get("weight")),
+        # Integer like the SQL column, so every path renders "4 for $67.04"
+        "case_size": int(_number(product.get("case_size"))),
+        "case_price": _number(product.get("case_price")),
+    }
+
+
+def row_match(row: Dict[str, Any], score: float = 0.0) -> Optional[Match]:
+    """Shape a SQLite products row like a vector match; None for rows that are not products."""
+    if not row.get("name"):
+        return None
+    # Rows without a SKU (e.g. SELECT name, price) still fuse by name
+    key = row.get("sku") or row["name"]
+    metadata = {
+        "name": row["name"],
+        "category": row.get("category"),
+        "price": row.get("price"),
+        "LB_price": row.get("lb_price"),
+        "SKU": row.get("sku"),
+        "UPC": row.get("upc"),
+        "brand": row.get("brand"),
+        "product_url": row.get("product_url"),
+        "image_url": row.get("image_url"),
+        "weight": row.get("weight"),
+        "case_size": row.get("case_size"),
+        "case_price": row.get("case_price"),
+    }
+    return Match(f"product_{key}", score, metadata)
+
+
+class Retriever:
+    """Interface for nearest-neighbour lookups over product embeddings."""
+
+    def query(self, vector: List[float], top_k: int = 3) -> List[Any]:
+        """Return the top_k matches for an embedding, best first."""
+        raise NotImplementedError
+
+
+class PineconeRetriever(Retriever):
+    """Retriever backed by a remote Pinecone index.
+
+    Pass the index, or a connect function that returns it; connecting
+    resolves the index host over the network, so it waits for the first query.
+    """
+
+    def __init__(self, index=None, connect: Optional[Callable[[], Any]] = None):
+        if index is None and connect is None:
+            raise ValueError("either index or connect is required")
+        self._index = index
+        self._connect = connect
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._connect()
+        return self._index
+
+    def query(self, vector: List[float], top_k: int = 3) -> List[Any]:
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=True
+        )
+        return results.matches
+
+
+class LocalVectorIndex(Retriever):
+    """In-process exact cosine search over a matrix of normalized embeddings.
+
+    The matrix is stored as an .npy file and the ids and metadata in a JSON
+    sidecar with the same stem, so the index can be memory-mapped at startup.
+    """
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]], model: Optional[str] = None):
+        if len(matrix) != len(ids) or len(ids) != len(metadata):
+            raise ValueError("matrix, ids and metadata must have the same length")
+        self.matrix = matrix
+        self.ids = ids
+        self.metadata = metadata
+        self.model = model
+
+    @classmethod
+    def build(cls, ids: List[str], embeddings: List[List[float]], metadata: List[Dict[str, Any]], model: Optional[str] = None) -> "LocalVectorIndex":
+        """Create an index from raw embeddings, normalizing each row."""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return cls(matrix / norms, list(ids), list(metadata), model)
+
+    @staticmethod
+    def sidecar_path(path: str) -> str:
+        return os.path.splitext(path)[0] + ".json"
+
+    @classmethod
+    def exists(cls, path: str = LOCAL_INDEX_PATH) -> bool:
+        return os.path.exists(path) and os.path.exists(cls.sidecar_path(path))
+
+    def save(self, path: str = LOCAL_INDEX_PATH):
+        """Persist the matrix and its sidecar."""
+        np.save(path, self.matrix)
+        with open(self.sidecar_path(path), 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model, "ids": self.ids, "metadata": self.metadata}, f)
+
+    @classmethod
+    def load(cls, path: str = LOCAL_INDEX_PATH, mmap: bool = True) -> "LocalVectorIndex":
+        """Load an index saved with save(), memory-mapping the matrix by default."""
+        matrix = np.load(path, mmap_mode='r' if mmap else None)
+        with open(cls.sidecar_path(path), 'r', encoding='utf-8') as f:
+            sidecar = json.load(f)
+        return cls(matrix, sidecar["ids"], sidecar["metadata"], sidecar.get("model"))
+
+    def warm(self):
+        """Read the whole matrix once so a memory-mapped index serves its first query from RAM."""
+        if len(self.ids):
+            float(np.asarray(self.matrix).sum())
+
+    def query(self, vector: List[float], top_k: int = 3) -> List[Match]:
+        if not self.ids:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+        scores = self.matrix @ q
+
+        top_k = min(top_k, len(self.ids))
+        if top_k < len(self.ids):
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(self.ids))
+        top = top[np.argsort(-scores[top])]
+        return [Match(self.ids[i], float(scores[i]), self.metadata[i]) for i in top]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Any]], top_k: Optional[int] = 3, k: int = 60) -> List[Match]:
+    """Merge ranked match lists by reciprocal rank, keyed on match id.
+
+    Each match contributes 1 / (k + rank) to its id's score; the metadata of
+    the first list an id appears in is kept. top_k=None keeps every id.
+    """
+    scores: Dict[str, float] = {}
+    metadata: Dict[str, Dict[str, Any]] = {}
+    for matches in result_lists:
+        for rank, match in enumerate(matches, start=1):
+            scores[match.id] = scores.get(match.id, 0.0) + 1.0 / (k + rank)
+            metadata.setdefault(match.id, match.metadata)
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [Match(match_id, scores[match_id], metadata[match_id]) for match_id in ranked]
@@ -0,0 +1,162 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+
+from .retrievers import Match, product_metadata
+
+# Catalog identifiers are all-digit SKUs and UPCs
+IDENTIFIER = re.compile(r"\b\d{5,14}\b")
+# Words that may surround a pasted identifier without changing what is asked
+IDENTIFIER_FILLER = frozenset("""
+sku skus upc upcs number no item product code id look lookup up find show me what is the for of please
+""".split())
+# Most products a brand/category route may match and still skip retrieval
+MAX_KEYWORD_PRODUCTS = 8
+
+
+@dataclass
+class Route:
+    """A confident pre-retrieval hit.
+
+    kind is "sku", "upc", "brand", "category" or "brand+category". When
+    answer is set the turn needs no model call at all; otherwise matches is
+    the whole context.
+    """
+    kind: str
+    matches: List[Match]
+    answer: Optional[str] = None
+
+
+def _phrase_pattern(phrases: List[str]) -> Optional[re.Pattern]:
+    """One alternation over the phrases, longest first, on word boundaries, plural-tolerant."""
+    if not phrases:
+        return None
+    alternatives = "|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)({alternatives})s?(?!\w)")
+
+
+def format_product_answer(product: Dict[str, Any]) -> str:
+    """Render a product record as a complete answer without the model."""
+    lines = [f"**{product.get('name', 'N/A')}**"]
+    if product.get("image_url"):
+        lines.append(f"![{product.get('name', '')}]({product['image_url']})")
+    lines.append(f"- Brand: {product.get('brand', 'N/A')}")
+    lines.append(f"- Category: {product.get('category', 'N/A')}")
+    lines.append(f"- SKU: {product.get('SKU_number', 'N/A')}")
+    lines.append(f"- UPC: {product.get('UPC_number', 'N/A')}")
+    lines.append(f"- Price: ${product.get('price', 'N/A')}")
+    if product.get("LB_price"):
+        lines.append(f"- Price per pound: ${product['LB_price']}/lb")
+    if product.get("case_size"):
+        lines.append(f"- Case size: {product['case_size']}")
+    if product.get("case_price"):
+        lines.append(f"- Case price: ${product['case_price']}")
+    if product.get("related_products"):
+        lines.append(f"- Related products: {', '.join(product['related_products'][:5])}")
+    if product.get("product_url"):
+        lines.append(f"- [View product]({product['product_url']})")
+    return "\n".join(lines)
+
+
+class ProductLookup:
+    """In-memory hash indexes over the catalog for exact SKU, UPC, brand and category hits."""
+
+    def __init__(self, products: List[Dict[str, Any]]):
+        self.by_sku: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_upc: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_brand: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for product in products:
+            # The catalog repeats some records verbatim; index each SKU once
+            sku = product.get("SKU_number")
+            if sku is not None and str(sku) in self.by_sku:
+                continue
+            for key, index in ((sku, self.by_sku),
+                               (product.get("UPC_number"), self.by_upc),
+                               (product.get("brand"), self.by_brand),
+                               (product.get("category"), self.by_category)):
+                if key not in (None, ""):
+                    index.setdefault(str(key).lower(), []).append(product)
+        self.brand_pattern = _phrase_pattern(list(self.by_brand))
+        self.category_pattern = _phrase_pattern(list(self.by_category))
+
+    @classmethod
+    def from_json(cls, json_path: str) -> "ProductLookup":
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls([data] if isinstance(data, dict) else data)
+
+    @staticmethod
+    def _matches(products: List[Dict[str, Any]]) -> List[Match]:
+        return [Match(f"product_{p.get('SKU_number')}", 1.0, product_metadata(p)) for p in products]
+
+    def _identifier_route(self, query: str) -> Optional[Route]:
+        identifiers = IDENTIFIER.findall(query)
+        if not identifiers:
+            return None
+        kind, products = "sku", []
+        for identifier in dict.fromkeys(identifiers):
+            if identifier in self.by_sku:
+                products.extend(self.by_sku[identifier])
+            elif identifier in self.by_upc:
+                kind = "upc"
+                products.extend(self.by_upc[identifier])
+            else:
+                # An unknown number may be a quantity or price; let retrieval handle it
+                return None
+        rest = [w for w in re.findall(r"[a-z]+", IDENTIFIER.sub(" ", query.lower())) if w not in IDENTIFIER_FILLER]
+        answer = "\n\n".join(format_product_answer(p) for p in products) if not rest else None
+        return Route(kind, self._matches(products), answer)
+
+    def _keyword_route(self, query: str) -> Optional[Route]:
+        text = query.lower()
+        kinds, selected = [], None
+        for kind, pattern, index in (("brand", self.brand_pattern, self.by_brand),
+                                     ("category", self.category_pattern, self.by_category)):
+            found = set(m.group(1) for m in pattern.finditer(text)) if pattern else set()
+            if len(found) > 1:
+                return None
+            if found:
+                products = index[found.pop()]
+                kinds.append(kind)
+                selected = products if selected is None else [p for p in selected if p in products]
+        # Confident only when the keywords narrow the catalog to a handful of products
+        if not selected or len(selected) > MAX_KEYWORD_PRODUCTS:
+            return None
+        return Route("+".join(kinds), self._matches(selected))
+
+    def route(self, query: str) -> Optional[Route]:
+        """Return a Route when the query names a known product, brand or category."""
+        return self._identifier_route(query) or self._keyword_route(query)
+
+
+# Questions answered by aggregating the table rather than by finding products
+AGGREGATE_PATTERN = re.compile(r"\b(how many|count|number of|total|average|avg|sum of)\b")
+# Filters, sorting and comparisons that SQL answers exactly
+STRUCTURED_PATTERN = re.compile(
+    r"\$|\d|\b(cheap|cheaper|cheapest|expensive|price|prices|priced|cost|costs|under|below|over|above|"
+    r"less than|more than|least|most|lowest|highest|per pound|lbs?|case|cases|brands?|categor(y|ies)|list|all)\b"
+)
+
+
+@dataclass
+class RetrievalPlan:
+    """Which retrieval branches a query is worth paying for."""
+    vector: bool = True
+    sql: bool = True
+
+
+def plan_retrieval(query: str) -> RetrievalPlan:
+    """Predict from the wording alone which branches will contribute.
+
+    Aggregates only need SQL, descriptive questions (pairings, storage,
+    recommendations) only need the vector index, and anything with a filter
+    or ordering uses both.
+    """
+    text = query.lower()
+    if AGGREGATE_PATTERN.search(text):
+        return RetrievalPlan(vector=False, sql=True)
+    if STRUCTURED_PATTERN.search(text):
+        return RetrievalPlan(vector=True, sql=True)
+    return RetrievalPlan(vector=True, sql=False)
@@ -0,0 +1,139 @@
+"""Scraper progress and HTTP validators, kept in SQLite next to the catalog.
+
+A run is numbered; listing pages and products are stamped with the run
+that listed and finished them, so an interrupted run resumes from its
+next listing page without refetching finished products. ETag,
+Last-Modified and a hash of each page body are kept for conditional
+fetches on the next run.
+"""
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .crawler import Page
+
+
+def state_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".scrape.db"
+
+
+class ScrapeState:
+    """Resumable scrape position and conditional-fetch validators."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pages (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            entries TEXT NOT NULL,
+            run INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            position INTEGER,
+            listed_run INTEGER,
+            done_run INTEGER
+        );
+        ''')
+        self._conn.commit()
+
+    def _get(self, key: str, default: str) -> str:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set(self, key: str, value: Any):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def begin(self) -> Tuple[int, bool]:
+        """(run number, resumed): the unfinished run if there is one, otherwise a new run."""
+        with self._lock, self._conn:
+            run = int(self._get("run", "0"))
+            if run and self._get("complete", "1") == "0":
+                return run, True
+            run += 1
+            self._set("run", run)
+            self._set("complete", 0)
+            self._set("next_page", 1)
+            return run, False
+
+    def finish(self):
+        with self._lock, self._conn:
+            self._set("complete", 1)
+
+    @property
+    def next_page(self) -> int:
+        with self._lock:
+            return int(self._get("next_page", "1"))
+
+    def page(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body_hash, entries, run FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "body_hash": row[2], "entries": json.loads(row[3]), "run": row[4]}
+
+    def save_page(self, run: int, page_num: int, page: Page, entries: List[Dict[str, Any]]):
+        """Record a listing page and its products, and move the resume point past it."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body_hash, entries, run) VALUES (?, ?, ?, ?, ?, ?)",
+                (page.url, page.etag, page.last_modified, page.body_hash if not page.not_modified else self._body_hash(page.url),
+                 json.dumps(entries), run)
+            )
+            for index, entry in enumerate(entries):
+                self._conn.execute('''
+                INSERT INTO products (url, position, listed_run) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET position = excluded.position, listed_run = excluded.listed_run
+                WHERE products.listed_run IS NOT excluded.listed_run
+                ''', (entry["product_url"], page_num * 10000 + index, run))
+            self._set("next_page", page_num + 1)
+
+    def _body_hash(self, url: str) -> Optional[str]:
+        row = self._conn.execute("SELECT body_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def product(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT etag, last_modified, body_hash FROM products WHERE url = ?", (url,)).fetchone()
+        return {"etag": row[0], "last_modified": row[1], "body_hash": row[2]} if row else None
+
+    def product_done(self, run: int, url: str, page: Optional[Page]):
+        with self._lock, self._conn:
+            if page is None or page.not_modified:
+                self._conn.execute("UPDATE products SET done_run = ? WHERE url = ?", (run, url))
+            else:
+                self._conn.execute(
+                    "UPDATE products SET done_run = ?, etag = ?, last_modified = ?, body_hash = ? WHERE url = ?",
+                    (run, page.etag, page.last_modified, page.body_hash, url)
+                )
+
+    def done(self, run: int) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT url FROM products WHERE done_run = ?", (run,))}
+
+    def listed(self, run: int) -> List[str]:
+        """Product URLs listed in the run, in listing order."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT url FROM products WHERE listed_run = ? ORDER BY position", (run,)
+            )]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
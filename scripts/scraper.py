@@ -1,225 +1,226 @@
-import requests  
-from bs4 import BeautifulSoup 
+"""Scrape the shop's cheese department into fixture/cheese_data.json.
+
+Run with `python -m scripts.scraper`; see scripts/crawler.py for the
+worker, politeness and retry settings.
+
+Scraping is incremental. Records are appended to <catalog>.jsonl as they
+are parsed and progress is kept in <catalog>.scrape.db, so an
+interrupted run picks up where it stopped. Pages are fetched
+conditionally (ETag/Last-Modified, or a hash of the body when the server
+sends neither) and unchanged products are not rendered again. When a run
+completes, the catalog is rewritten and the SKUs added, changed and
+removed are written to <catalog>.changes.json, with the hashes of the
+catalogs before and after, for downstream loaders (see
+scripts/artifact.py, which applies them to the previous catalog
+database instead of rebuilding it).
+"""
+import argparse
+import hashlib
+import json
+import logging
 import os
-import time
-import re
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from urllib.parse import urljoin  
-
-base_url = "https://shop.kimelo.com/department/cheese/3365"  
-total_data =[]
-chrome_options = Options()
-chrome_options.add_argument("--headless")
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-json_filename = "./fixture/cheese_data.json"  
-
-# Create a driver instance
-driver = webdriver.Chrome(options=chrome_options)
-
-def extract_numbers_as_ints(text):
-    number_strings = re.findall(r'-?\d+', text)
-    return [int(num) for num in number_strings]
-
-def extract_numbers_as_floats(text):
-    number_strings = re.findall(r'-?\d+\.\d+|-?\d+', text)
-    return [float(num) for num in number_strings]
-
-for page_num in range(5):
-    url = f"{base_url}?page={page_num+1}"
-    # print(url)
-    try:  
-        response = requests.get(url)  
-        response.raise_for_status()  # Raise an exception for bad status codes  
-
-        soup = BeautifulSoup(response.content, 'html.parser')  
-
-        # Find elements that contain cheese data  
-        # This will likely involve inspecting the website's HTML structure  
-        # using your browser's developer tools (F12).  
-        # Look for common patterns like product names, prices, descriptions, etc.  
-
-        # Example: Assuming cheese items are in div elements with a specific class  
-        cheese_items = soup.find_all('div', class_='css-0') # Replace 'product-item' with the actual class  
-        if cheese_items:  
-            for item in cheese_items:  
-                data={}
-                # Extract data points for each cheese item  
-                # Again, you'll need to inspect the HTML to find the right tags and classes  
-                name = item.find('p', class_='chakra-text css-pbtft') # Replace 'product-name'  
-                brand = item.find('p', class_='chakra-text css-w6ttxb')
-                # You might also look for descriptions, images, etc.                  
-               
-                if name != None:
-                    name=name.text.strip()
-                else:
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .crawler import (
+    BASE_URL, CRAWL_FETCHER, CRAWL_MAX_PAGES, CRAWL_WORKERS, Crawler, HttpFetcher, Page, make_fetcher,
+)
+from .parsers import parse_listing
+from .scrape_state import ScrapeState, state_path
+from .telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
+
+json_filename = "./fixture/cheese_data.json"
+
+
+def stream_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".jsonl"
+
+
+def changes_path(catalog_path: str) -> str:
+    return os.path.splitext(catalog_path)[0] + ".changes.json"
+
+
+def load_catalog(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def write_json(path: str, data: Any, indent: Optional[int] = None):
+    """Write atomically so readers never see half a file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def read_stream(path: str) -> Dict[str, Dict[str, Any]]:
+    """Records from a JSONL stream by product URL, the last one winning."""
+    records = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line cut off by a crash
                     continue
-                product_url = item.find('a', class_="chakra-card group css-5pmr4x").get('href')
-                product_url = "https://shop.kimelo.com/" + product_url
-                data["name"]=name
-                data['brand']=brand.text.strip()
-               
-                data['product_url']=product_url
-
-                # print(f"Cheese Name: {name}")  
-                # print(f"position {position}")
-                # print(f"Price: {price}")  
-                # print(f"LB_price {LB_price}")
-                
-                image_tag = item.find('img')  
-
-                if image_tag and 'src' in image_tag.attrs:  
-                    image_url = image_tag['src']  
-
-                    # Construct the full image URL if it's a relative path  
-                    if image_url.startswith('//'):  
-                        image_url = 'http:' + image_url  
-                    elif image_url.startswith('/'):  
-                        # You might need to get the base domain from the original URL  
-                        image_url = urljoin(url, image_url)  
-                    data['image_url']=image_url
-                
-                #detailed scraping
-                print("detailed data")
-                print(data['name'])
-                # Navigate to the URL # Replace with your target URL
-                driver.get(product_url)
-                
-                # Wait for the page to load (adjust as needed)
-                time.sleep(3)
-                
-                # Get the page source after JavaScript execution
-                html_content = driver.page_source
-                
-                # Parse with BeautifulSoup
-                soup = BeautifulSoup(html_content, 'html.parser')
-                # Extract SKU & UPC number.
-                numbers = soup.find_all('p', class_='chakra-text css-0')
-                category = soup.find_all('a', class_='chakra-link chakra-breadcrumb__link css-1vtk5s8')
-                
-                if category[0].text.strip() == 'Cheese':
-                    data['category']=category[1].text.strip()
+                records[record["product_url"]] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _sku(record: Dict[str, Any]) -> str:
+    sku = record.get("SKU_number", record.get("SKU"))
+    return str(sku) if sku is not None else record.get("product_url", "")
+
+
+def _record_hash(record: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(record, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def catalog_hash(records: List[Dict[str, Any]]) -> str:
+    """Identifies a catalog's records; a changes file applies between the two catalogs it names."""
+    return hashlib.sha256(json.dumps(records, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def diff_catalogs(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """SKUs added, changed and removed between two catalogs."""
+    def hashes(records):
+        by_sku: Dict[str, List[str]] = {}
+        for record in records:
+            by_sku.setdefault(_sku(record), []).append(_record_hash(record))
+        return {sku: sorted(h) for sku, h in by_sku.items()}
+
+    before, after = hashes(old), hashes(new)
+    return {
+        "added": sorted(set(after) - set(before)),
+        "changed": sorted(sku for sku in set(after) & set(before) if after[sku] != before[sku]),
+        "removed": sorted(set(before) - set(after)),
+    }
+
+
+class IncrementalScraper:
+    """Runs the crawler against the previous catalog, skipping what has not changed."""
+
+    def __init__(self, crawler: Crawler, catalog_path: str = json_filename, full: bool = False):
+        self.crawler = crawler
+        self.catalog_path = catalog_path
+        # Ignore validators and refetch every page
+        self.full = full
+        self.state = ScrapeState(state_path(catalog_path))
+        self.previous = {r.get("product_url"): r for r in load_catalog(catalog_path)}
+        self.unchanged = 0
+
+    def _entries(self, run: int, done: set, base_url: str, max_pages: int) -> Iterator[Dict[str, Any]]:
+        """Listing entries still to fetch; pages before the resume point come from the state."""
+        seen = set()
+        next_page = self.state.next_page
+        for page_num in range(1, max_pages + 1):
+            url = f"{base_url}?page={page_num}"
+            known = self.state.page(url)
+            if page_num < next_page and known is not None:
+                entries = known["entries"]
+            else:
+                validators = (known["etag"], known["last_modified"]) if known and not self.full else (None, None)
+                page = self.crawler.get(url, *validators)
+                if page.not_modified or (known and not self.full and page.body_hash == known["body_hash"]):
+                    entries = known["entries"]
                 else:
-                    data['category']=category[0].text.strip()
-                    
-                # print(data['category'])
-                data['SKU_number']=extract_numbers_as_ints(numbers[0].text.strip())[0]
-                data['UPC_number']=extract_numbers_as_ints(numbers[1].text.strip())[0]
-                
-                # Find the table
-                table = soup.find('table', class_='chakra-table')
-                # print("table_data")
-                # Extract headers
-                headers = []
-                header_row = table.find('thead').find('tr')
-                for th in header_row.find_all('th'):
-                    headers.append(th.text.strip())
-                
-                # Extract table data
-                rows = []
-                for tr in table.find('tbody').find_all('tr'):
-                    row_data = []
-                    for td in tr.find_all('td'):
-                        row_data.append(td.text.strip())
-                    rows.append(row_data)
-                data['table_data']=[headers,rows]
-                data['weight']=rows[2][-1]
-                data['weight']=extract_numbers_as_floats(data['weight'])[0]
-                print(data['weight'])
-                # Print results
-                # print("Headers:", headers)
-                # print("Data:")
-                # for row in rows:
-                #     print(row)
-                
-                like_products=soup.find('div', class_='col-span-2 css-0')
-                # print(like_products)
-                if like_products != None:
-                    like_products=like_products.findAll('p', class_='chakra-text css-pbtft') 
-                    # print("like_products:")
-                    # print(like_products)
-                    list=[]
-                    for product in like_products:
-                        list.append(product.text.strip())
-                    like_products=list
-                    # print(like_products)
-                    data['like_products']=like_products
-                else:
-                    data['like_products']=[]
-                print("prices")
-                prices=soup.find('div', class_='relative shadow-md border rounded-lg p-4 sticky top-[100px] css-1811skr').findAll('div', class_='css-1ktp5rg')
-                LB_price=soup.find('div', class_='relative shadow-md border rounded-lg p-4 sticky top-[100px] css-1811skr').find('span', class_='chakra-badge css-1mwp5d1')
-                i=0
-                for price in prices:
-                    price=price.find('b', class_='chakra-text css-0').text.strip()
-                    price=extract_numbers_as_floats(price)[0]
-                    prices[i]=price
-                    i+=1
-                print(prices)
-                if len(prices) == 2:
-                    if prices[0] > prices[1]:
-                        data['price']=prices[1]
-                        data['case_price']=prices[0]
-                    else:
-                        data['price']=prices[0]
-                        data['case_price']=prices[1]
-                    case_size=extract_numbers_as_ints(data['table_data'][1][0][0])
-                    data['case_size']=case_size[0]
-                    print(case_size)
-                else:
-                    data['price']=prices[0]
-                    data['case_size']=1
-                    data['case_price']=prices[0]
-                print(data['price'])
-                print(data['case_price'])
-                if LB_price != None:
-                    data['LB_price']=LB_price.text.strip()
-                    data['LB_price']=extract_numbers_as_floats(data['LB_price'])[0]
-                else:
-                    data['LB_price']=0
-                # print("related_products")
-                # print(related_products)
-                
-                related_products=soup.find('div', class_='relative shadow-md border rounded-lg p-4 sticky top-[100px] css-1811skr').findAll('div', class_='relative css-1bpq4gx')
-                list=[]
-                for product in related_products:
-                    temp=product.find('p', class_='chakra-text css-pbtft')
-                    temp=temp.text.strip()
-                    list.append(temp)
-                related_products=list
-                data['related_products']=related_products
-
-                list=[]
-                product_images=soup.find('div', class_='chakra-tabs__tablist mt-2 css-wjy2tx').findAll('img')
-                for image in product_images:
-                    list.append(urljoin(url, image['src']))
-                product_images=list
-                data['product_images']=product_images
-                # print(data)
-                total_data.append(data)
-
-        else:  
-            print("Could not find any cheese items. The class name might be incorrect.");
-
-    except requests.exceptions.RequestException as e:  
-        print(f"Error fetching the URL: {e}")  
-    except Exception as e:  
-        print(f"An error occurred: {e}")  
-
-driver.quit()
-import json  
-
-# Your Python list (array data)  
-
-
-try:  
-    with open(json_filename, 'w', encoding='utf-8') as f:  
-        # json.dump() works directly with the list  
-        json.dump(total_data, f, indent=4)  
-
-    print(f"Successfully saved array data to {json_filename}")  
-
-except IOError as e:  
-    print(f"Error writing to JSON file: {e}")  
\ No newline at end of file
+                    entries = parse_listing(page.text, url)
+                new = [entry for entry in entries if entry["product_url"] not in seen]
+                if not new:
+                    return
+                self.state.save_page(run, page_num, page, entries)
+            for entry in entries:
+                if entry["product_url"] in seen:
+                    continue
+                seen.add(entry["product_url"])
+                if entry["product_url"] not in done:
+                    yield entry
+
+    def _fetch(self, entry: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Page]:
+        """(entry, record or None when unchanged, page) for one product."""
+        url = entry["product_url"]
+        known = self.state.product(url) if url in self.previous and not self.full else None
+        page = self.crawler.get(url, known["etag"], known["last_modified"]) if known else self.crawler.get(url)
+        if known and (page.not_modified or page.body_hash == known["body_hash"]):
+            return entry, None, page
+        # The served page already has everything when product pages are not rendered
+        html = page.text if isinstance(self.crawler.detail_fetcher, HttpFetcher) else None
+        return entry, self.crawler.product(entry, html), page
+
+    def run(self, base_url: str = BASE_URL, max_pages: int = CRAWL_MAX_PAGES) -> Dict[str, List[str]]:
+        """Scrape until the listing runs out, then write the catalog and return the changed SKUs."""
+        run, resumed = self.state.begin()
+        done = self.state.done(run)
+        stream = stream_path(self.catalog_path)
+        if resumed:
+            logger.info("resuming scrape run %d: %d products already done", run, len(done))
+        elif os.path.exists(stream):
+            os.remove(stream)
+
+        with open(stream, 'a', encoding='utf-8') as out:
+            for entry, record, page in self.crawler.products(self._entries(run, done, base_url, max_pages), self._fetch):
+                if record is None:
+                    self.unchanged += 1
+                    # Listing fields (name, brand, image) can change without the product page changing
+                    record = {**self.previous[entry["product_url"]], **entry}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                self.state.product_done(run, entry["product_url"], page)
+
+        records = read_stream(stream)
+        catalog = []
+        for url in self.state.listed(run):
+            record = records.get(url) or self.previous.get(url)
+            if record is None:
+                continue
+            if url not in records:
+                logger.warning("keeping the previous record for %s, which failed this run", url)
+            catalog.append(record)
+        changes = diff_catalogs(list(self.previous.values()), catalog)
+        write_json(self.catalog_path, catalog, indent=4)
+        write_json(changes_path(self.catalog_path), {
+            **changes, "base": catalog_hash(list(self.previous.values())), "catalog": catalog_hash(catalog),
+        })
+        self.state.finish()
+        return changes
+
+    def close(self):
+        self.state.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the cheese department into a JSON catalog.")
+    parser.add_argument("--output", default=json_filename)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--max-pages", type=int, default=CRAWL_MAX_PAGES)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--fetcher", choices=("browser", "http"), default=CRAWL_FETCHER,
+                        help="how product pages are loaded")
+    parser.add_argument("--full", action="store_true", help="refetch every page, ignoring ETags and hashes")
+    args = parser.parse_args()
+    configure_logging()
+
+    crawler = Crawler(HttpFetcher(), make_fetcher(args.fetcher), workers=args.workers)
+    scraper = IncrementalScraper(crawler, args.output, full=args.full)
+    try:
+        changes = scraper.run(args.base_url, args.max_pages)
+    finally:
+        crawler.close()
+        scraper.close()
+
+    print(f"Successfully saved catalog to {args.output} ({scraper.unchanged} products unchanged)")
+    print(f"added {len(changes['added'])}, changed {len(changes['changed'])}, removed {len(changes['removed'])} SKUs; "
+          f"see {changes_path(args.output)}")
+    if crawler.failed:
+        print(f"{len(crawler.failed)} products failed this run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .memory import ConversationMemory
+
+logger = logging.getLogger(__name__)
+
+# Conversations kept in memory; the least recently used are evicted past this
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+# Seconds a session may sit idle before it is dropped; 0 keeps it until evicted
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+# SQLite file that keeps conversations across restarts; "" keeps them in memory only
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "")
+
+
+class SessionStore:
+    """Per-session conversation memory keyed by session id.
+
+    Sessions live in an LRU capped at maxsize and expire after idle_ttl
+    seconds without use. With a path, each session's memory is also saved
+    to SQLite after every turn and reloaded when the session comes back.
+    """
+
+    def __init__(self, factory: Callable[[], ConversationMemory], maxsize: int = SESSION_CACHE_SIZE,
+                 idle_ttl: float = SESSION_IDLE_TTL, path: Optional[str] = SESSION_DB_PATH):
+        self.factory = factory
+        self.maxsize = maxsize
+        self.idle_ttl = idle_ttl
+        self.path = path or None
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.path:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            ''')
+            self._conn.commit()
+
+    def _expired(self, last_used: float, now: float) -> bool:
+        return bool(self.idle_ttl) and last_used + self.idle_ttl < now
+
+    def _load(self, session_id: str) -> ConversationMemory:
+        memory = self.factory()
+        if self._conn is not None:
+            row = self._conn.execute("SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is not None and not self._expired(row[1], time.time()):
+                memory.restore(json.loads(row[0]))
+        return memory
+
+    def get(self, session_id: str) -> ConversationMemory:
+        """Return the session's memory, creating or reloading it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and not self._expired(entry[1], now):
+                self._sessions.move_to_end(session_id)
+                entry[1] = now
+                return entry[0]
+            memory = self._load(session_id)
+            self._sessions[session_id] = [memory, now]
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return memory
+
+    def _evict(self, now: float):
+        # Idle sessions sit at the front, so stop at the first one still in use
+        while self._sessions:
+            session_id, (memory, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.maxsize and not self._expired(last_used, now):
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def save(self, session_id: str, memory: ConversationMemory):
+        """Write a session's memory to SQLite, if the store has a path.
+
+        The memory is passed in rather than looked up, so a turn still lands
+        on disk when its session was evicted while the turn was running.
+        """
+        if self._conn is None:
+            return
+        state = json.dumps(memory.state())
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)",
+                (session_id, state, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, session_id: str):
+        """Forget a session's conversation."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                entry[0].clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "evictions": self.evictions}
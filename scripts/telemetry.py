@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# "text" for human-readable lines, "json" for one JSON object per record
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# When set, every timed span is appended here as a JSON line
+TELEMETRY_JSONL = os.getenv("TELEMETRY_JSONL", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Stage latency buckets in seconds, from SQLite lookups up to long completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger(__name__)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as JSON, including any `extra` fields."""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Set up root logging once for an entry point."""
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Sink:
+    """Receives every span as it finishes."""
+
+    def emit(self, event: Dict[str, Any]):
+        raise NotImplementedError
+
+
+class JsonLinesSink(Sink):
+    """Appends span events to a JSON lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, event: Dict[str, Any]):
+        line = json.dumps(event, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+class Telemetry:
+    """Process-wide registry of stage histograms, counters and gauge collectors."""
+
+    def __init__(self, namespace: str = "cheese_chat"):
+        self.namespace = namespace
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.collectors: List[Callable[[], Dict[Tuple[str, Labels], float]]] = []
+        self.sinks: List[Sink] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def add_sink(self, sink: Sink):
+        self.sinks.append(sink)
+
+    def add_collector(self, collector: Callable[[], Dict[Tuple[str, Labels], float]]):
+        """Register a callback returning gauge values, read at export time."""
+        self.collectors.append(collector)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, value: float = 1.0, **labels):
+        key = (name, self._labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[Dict[str, Any]]:
+        """Time a pipeline stage into the stage_seconds histogram.
+
+        Yields a dict the caller may add fields to; they are passed to sinks.
+        """
+        fields: Dict[str, Any] = {}
+        start = time.perf_counter()
+        error = None
+        try:
+            yield fields
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("stage_seconds", duration, stage=stage, **labels)
+            if error:
+                self.increment("stage_errors_total", stage=stage, error=error)
+            logger.debug("stage %s took %.1f ms", stage, duration * 1000,
+                         extra={"stage": stage, "duration_ms": duration * 1000, **fields})
+            if self.sinks:
+                event = {"ts": time.time(), "stage": stage, "duration_s": duration, "error": error, **labels, **fields}
+                for sink in self.sinks:
+                    try:
+                        sink.emit(event)
+                    except Exception:
+                        logger.exception("telemetry sink failed")
+
+    def record_usage(self, stage: str, model: Optional[str], usage: Any):
+        """Count prompt and completion tokens from an OpenAI usage object."""
+        if usage is None:
+            return
+        for kind in ("prompt_tokens", "completion_tokens"):
+            tokens = getattr(usage, kind, None)
+            if tokens:
+                self.increment("tokens_total", tokens, stage=stage, model=model or "", kind=kind.split("_")[0])
+        # Prompt tokens served from the provider's prompt cache
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if cached:
+            self.increment("tokens_total", cached, stage=stage, model=model or "", kind="cached")
+
+    def render_prometheus(self) -> str:
+        """Export everything in the Prometheus text format."""
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        for (name, labels), histogram in sorted(histograms):
+            metric = f"{self.namespace}_{name}"
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{fmt(labels, (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_bucket{fmt(labels, (('le', '+Inf'),))} {histogram.count}")
+            lines.append(f"{metric}_sum{fmt(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{fmt(labels)} {histogram.count}")
+        for (name, labels), value in sorted(counters):
+            lines.append(f"{self.namespace}_{name}{fmt(labels)} {value}")
+        for collector in self.collectors:
+            for (name, labels), value in sorted(collector().items()):
+                lines.append(f"{self.namespace}_{name}{fmt(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def cache_collector(name: str, cache) -> Callable[[], Dict[Tuple[str, Labels], float]]:
+    """Gauge collector for a cache exposing stats() with hits, misses and hit_rate.
+
+    cache may also be a function returning the cache, for one built on first use.
+    """
+    def collect():
+        stats = (cache() if callable(cache) else cache).stats()
+        labels = (("cache", name),)
+        return {
+            ("cache_hits", labels): stats["hits"] + stats.get("disk_hits", 0),
+            ("cache_misses", labels): stats["misses"],
+            ("cache_hit_rate", labels): stats["hit_rate"],
+            ("cache_size", labels): stats["size"],
+        }
+    return collect
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = telemetry.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics request: " + format, *args)
+
+
+def serve_metrics(port: int = METRICS_PORT) -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics from a daemon thread; does nothing when port is 0."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("serving metrics on :%d/metrics", port)
+    return server
+
+
+telemetry = Telemetry()
+if TELEMETRY_JSONL:
+    telemetry.add_sink(JsonLinesSink(TELEMETRY_JSONL))
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from scripts import cheese_chatbot, cheese_sql_chatbot
+from scripts.cache import EmbeddingCache
+from scripts.cheese_chatbot import FoodChatbot
+from scripts.cheese_sql_chatbot import CheeseSQLChatbot
+from scripts.config import clients
+from scripts.convert_data import prepare_product_text
+from scripts.fakes import FakeIndex, FakeOpenAI, synthetic_embedding
+from scripts.retrievers import LocalVectorIndex, PineconeRetriever, product_metadata
+from scripts.router import ProductLookup
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "fixture")
+CATALOG_PATH = os.path.join(FIXTURE, "cheese_data.json")
+
+
+@pytest.fixture(autouse=True)
+def offline():
+    """Fake OpenAI, an in-memory embedding cache and empty shared caches for every test."""
+    previous = clients.override(openai=FakeOpenAI(), embedding_cache=EmbeddingCache(path=None))
+    for cache in (cheese_sql_chatbot.sql_cache, cheese_chatbot.answer_cache):
+        cache.clear()
+    yield
+    clients.override(**previous)
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    return ProductLookup.from_json(CATALOG_PATH)
+
+
+@pytest.fixture(scope="session")
+def built_database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("catalog") / "cheese_database.db")
+    sql_chatbot = CheeseSQLChatbot(path, client=FakeOpenAI(), pool_size=1)
+    sql_chatbot.load_data_from_json(CATALOG_PATH)
+    sql_chatbot.pool.close()
+    return path
+
+
+@pytest.fixture
+def database(built_database, tmp_path):
+    """A private copy of the catalog database built from the fixture JSON."""
+    path = str(tmp_path / "cheese_database.db")
+    # The backup API includes rows still in the source's WAL file, which a file copy would miss
+    source, target = sqlite3.connect(built_database), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+
+@pytest.fixture(scope="session")
+def vector_index():
+    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    ids = [f"product_{p.get('SKU_number', i)}" for i, p in enumerate(data)]
+    embeddings = [synthetic_embedding(prepare_product_text(p)) for p in data]
+    return LocalVectorIndex.build(ids, embeddings, [product_metadata(p) for p in data])
+
+
+@pytest.fixture
+def fake_openai():
+    return clients.openai
+
+
+@pytest.fixture
+def make_chatbot(database, vector_index, catalog, fake_openai):
+    """Build FoodChatbots over the fakes; they are shut down after the test."""
+    bots = []
+
+    def make(**kwargs):
+        kwargs.setdefault("retriever", PineconeRetriever(FakeIndex(vector_index)))
+        kwargs.setdefault("sql_chatbot", CheeseSQLChatbot(database, client=fake_openai))
+        kwargs.setdefault("lookup", catalog)
+        kwargs.setdefault("openai_client", fake_openai)
+        bot = FoodChatbot(**kwargs)
+        bots.append(bot)
+        return bot
+
+    yield make
+    for bot in bots:
+        bot.executor.shutdown(wait=True)
+        bot.summary_executor.shutdown(wait=True)
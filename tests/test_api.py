@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+from scripts.api import Limiter, Overloaded, create_app
+from scripts.async_chatbot import AsyncFoodChatbot
+from scripts.fakes import FakeAsyncOpenAI
+
+
+@pytest.fixture
+def app(make_chatbot, fake_openai):
+    return create_app(lambda: AsyncFoodChatbot(make_chatbot(), client=FakeAsyncOpenAI(fake_openai)))
+
+
+def events(text):
+    return [json.loads(line[len("data: "):]) for line in text.splitlines() if line.startswith("data: ")]
+
+
+def test_rejects_non_object_body(app):
+    with TestClient(app) as client:
+        response = client.post("/chat", json=["feta"])
+        assert response.status_code == 400
+        assert client.get("/healthz").json()["active"] == 0
+
+
+def test_anonymous_clients_get_separate_sessions(app):
+    with TestClient(app) as client:
+        first = client.post("/chat", json={"message": "Can you recommend a cheese for pizza?", "stream": False}).json()
+        second = client.post("/chat", json={"message": "What did I ask?", "stream": False}).json()
+        assert first["response"] and first["session_id"] != second["session_id"]
+        streamed = client.post("/chat", json={"message": "What goes with feta?", "session_id": first["session_id"]})
+        assert streamed.headers["X-Session-Id"] == first["session_id"]
+        assert events(streamed.text)[-1]["session_id"] == first["session_id"]
+        assert client.get("/healthz").json()["active"] == 0
+
+
+def test_disconnect_before_first_chunk_releases_the_slot(app, make_chatbot):
+    app.state.bot = AsyncFoodChatbot(make_chatbot(), client=FakeAsyncOpenAI())
+    app.state.limiter = limiter = Limiter(concurrency=5)
+    body = json.dumps({"message": "Can you recommend a cheese for pizza?"}).encode()
+
+    async def disconnect_early():
+        messages = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            # The client is gone before the response headers go out
+            if message["type"] == "http.response.start":
+                await asyncio.Event().wait()
+
+        scope = {"type": "http", "method": "POST", "path": "/chat", "headers": [(b"content-type", b"application/json")],
+                 "query_string": b"", "app": app}
+        for _ in range(5):
+            messages[:] = [{"type": "http.request", "body": body, "more_body": False}]
+            await asyncio.wait_for(app.router(scope, receive, send), 5)
+
+    asyncio.run(disconnect_early())
+    assert limiter.active == 0
+
+
+def test_limiter_sheds_load():
+    async def scenario():
+        full = Limiter(concurrency=1, max_queue=0, timeout=1)
+        await full.acquire()
+        with pytest.raises(Overloaded, match="waiting"):
+            await full.acquire()
+        slow = Limiter(concurrency=1, max_queue=1, timeout=0.05)
+        await slow.acquire()
+        with pytest.raises(Overloaded, match="timed out"):
+            await slow.acquire()
+        assert slow.waiting == 0
+        slow.release()
+        await slow.drain(1)
+        assert slow.active == 0 and slow.draining
+        with pytest.raises(Overloaded):
+            await slow.acquire()
+
+    asyncio.run(scenario())
@@ -0,0 +1,79 @@
+import functools
+import json
+import time
+
+import pytest
+
+from scripts import artifact, cheese_chatbot
+from scripts.artifact import ArtifactWatcher, CatalogVersion, build, publish
+from scripts.cheese_chatbot import FoodChatbot
+from scripts.retrievers import LocalVectorIndex
+
+from .conftest import CATALOG_PATH
+
+SKU = "103674"
+
+
+def price(bot):
+    return bot.sql_chatbot.execute_query(f"SELECT price FROM products WHERE sku = '{SKU}'")[0]["price"]
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def artifact_bot(tmp_path, monkeypatch):
+    """A FoodChatbot following a catalog artifact under tmp_path, checking for new versions on every turn."""
+    root = str(tmp_path / "catalog")
+    build(CATALOG_PATH, root)
+    monkeypatch.setattr(cheese_chatbot, "VECTOR_BACKEND", "auto")
+    current = CatalogVersion.current
+    monkeypatch.setattr(CatalogVersion, "current", lambda path=root: current(path))
+    monkeypatch.setattr(cheese_chatbot, "ArtifactWatcher", functools.partial(ArtifactWatcher, root=root, check_interval=0))
+    bot = FoodChatbot()
+    yield bot, root
+    bot.executor.shutdown(wait=False, cancel_futures=True)
+    bot.summary_executor.shutdown(wait=True)
+
+
+def test_new_version_is_swapped_in(artifact_bot, tmp_path):
+    bot, root = artifact_bot
+    first = bot.catalog
+    assert price(bot) == 16.76
+    old_pool, old_retriever, old_version = bot.sql_chatbot.pool, bot.retriever, bot.catalog_version()
+
+    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    for product in data:
+        if str(product["SKU_number"]) == SKU:
+            product["price"] = 19.99
+    updated = str(tmp_path / "cheese_data.json")
+    with open(updated, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    second = build(updated, root)
+    assert second.version != first.version
+
+    # The old version keeps answering until the new one is loaded
+    bot.refresh_catalog()
+    wait_for(lambda: bot.catalog.version == second.version)
+    assert price(bot) == 19.99
+    assert "$19.99" in bot.lookup.route(f"SKU {SKU}").answer
+    assert bot.catalog_version() != old_version
+    assert old_pool._closed
+    assert isinstance(bot.retriever, LocalVectorIndex) and bot.retriever is not old_retriever
+    assert bot.watcher.version == second.version
+
+
+def test_broken_version_keeps_the_current_one(artifact_bot):
+    bot, root = artifact_bot
+    current = bot.catalog.version
+    publish("missing", root)
+    bot.refresh_catalog()
+    wait_for(lambda: not bot._swapping)
+    assert bot.catalog.version == current
+    assert price(bot) == 16.76
+    assert artifact.current_version(root) == "missing"
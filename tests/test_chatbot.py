@@ -0,0 +1,37 @@
+import threading
+import time
+
+from scripts import cheese_chatbot
+from scripts.fakes import FakeIndex, Latency
+from scripts.retrievers import PineconeRetriever
+
+
+def test_retrieve_fuses_both_branches(make_chatbot):
+    bot = make_chatbot()
+    retrieval = bot.retrieve("Which sliced cheese costs less than $30?")
+    assert retrieval.plan.vector and retrieval.plan.sql
+    assert retrieval.sql is not None and retrieval.sql.ok
+    assert retrieval.products
+
+
+def test_branch_deadline_starts_when_the_branch_runs(make_chatbot, monkeypatch):
+    monkeypatch.setattr(cheese_chatbot, "VECTOR_TIMEOUT", 0.5)
+    monkeypatch.setattr(cheese_chatbot, "SQL_TIMEOUT", 0.5)
+    bot = make_chatbot(max_workers=1)
+    # Another session's work holds the only worker for longer than either timeout
+    busy = threading.Event()
+    bot.executor.submit(lambda: (busy.set(), time.sleep(0.8)))
+    busy.wait()
+    retrieval = bot.retrieve("Which sliced cheese costs less than $30?")
+    assert retrieval.sql is not None and retrieval.sql.ok
+    assert retrieval.products
+
+
+def test_slow_branch_times_out(make_chatbot, vector_index, monkeypatch):
+    monkeypatch.setattr(cheese_chatbot, "VECTOR_TIMEOUT", 0.2)
+    monkeypatch.setattr(cheese_chatbot, "TEXT_SEARCH_MODE", "off")
+    bot = make_chatbot(retriever=PineconeRetriever(FakeIndex(vector_index, latency=Latency(0.6))))
+    start = time.monotonic()
+    retrieval = bot.retrieve("Can you recommend a cheese for my wine?")
+    assert time.monotonic() - start < 0.5
+    assert retrieval.products == []
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from scripts.cache import EmbeddingCache
+from scripts.config import Clients
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def test_importing_the_chatbot_is_lazy(tmp_path):
+    env = {k: v for k, v in os.environ.items() if k not in ("OPENAI_API_KEY", "PINECONE_API_KEY")}
+    env["PYTHONPATH"] = os.path.abspath(ROOT)
+    code = ("import json, sys; import scripts.cheese_chatbot, scripts.async_chatbot, scripts.convert_data, scripts.artifact; "
+            "print(json.dumps(sorted(m for m in ('openai', 'pinecone') if m in sys.modules)))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_clients_are_built_on_first_use():
+    built = []
+    clients = Clients({"openai": lambda: built.append("openai") or "real"})
+    assert built == []
+    assert clients.openai == "real" and clients.openai == "real"
+    assert built == ["openai"]
+
+    previous = clients.override(openai="fake")
+    assert clients.openai == "fake"
+    clients.override(**previous)
+    assert clients.openai == "real" and built == ["openai"]
+
+
+def test_embedding_cache_opens_on_first_use(tmp_path):
+    path = tmp_path / "embeddings.db"
+    cache = EmbeddingCache(path=str(path))
+    assert not path.exists()
+    cache.set("model", "Feta", [1.0, 2.0])
+    assert path.exists()
+    assert EmbeddingCache(path=str(path)).get("model", "feta") == [1.0, 2.0]
+
+
+def test_embedding_cache_falls_back_to_memory(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / "missing" / "embeddings.db"))
+    cache.set("model", "Feta", [1.0, 2.0])
+    assert cache.get("model", "feta") == [1.0, 2.0]
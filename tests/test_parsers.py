@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from scripts import parsers
+from scripts.parsers import ParseError, parse_detail, parse_listing, parse_product
+
+PAGES = os.path.join(os.path.dirname(__file__), "..", "fixture", "pages")
+LISTING_URL = "https://shop.kimelo.com/departments/cheese?page=1"
+PRODUCT_URL = "https://shop.kimelo.com//sku/cheese-american-120-slice-yellow-4-5-lb-103674/103674"
+
+
+def page(name: str) -> str:
+    with open(os.path.join(PAGES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def listing_html() -> str:
+    return page("listing.html")
+
+
+@pytest.fixture
+def detail_html() -> str:
+    return page("product_103674.html")
+
+
+def test_parse_listing(listing_html):
+    products = parse_listing(listing_html, LISTING_URL)
+    # The first card is also found through the css-0 grid wrapping every card
+    assert [p["product_url"].rsplit("/", 1)[-1] for p in products] == ["103674", "124254", "123341"]
+    assert products[0] == {
+        "name": "Cheese, American, 120 Slice, Yellow, (4) 5 Lb - 103674",
+        "brand": "Schreiber",
+        "product_url": PRODUCT_URL,
+        "image_url": "https://shop.kimelo.com/_next/image?url=https%3A%2F%2Fd3tlizm80tjdt4.cloudfront.net%2Fimage%2F15196"
+                     "%2Fimage%2Fsm-af4d520ed6ba1c0a2c2dbddaffd35ce4.png&w=3840&q=50",
+    }
+    # Protocol-relative images get a scheme; a missing brand is an empty string
+    assert products[2]["image_url"] == "http://d3tlizm80tjdt4.cloudfront.net/image/feta.png"
+    assert products[2]["brand"] == ""
+
+
+def test_parse_listing_skips_cards_without_a_name(listing_html):
+    html = listing_html.replace(
+        '<p class="chakra-text css-pbtft">Cheese, Feta, Crumbles, President, 2/5 Lb - 123341</p>', ''
+    )
+    assert [p["name"] for p in parse_listing(html, LISTING_URL)][-1].endswith("124254")
+
+
+def test_parse_listing_empty_page():
+    assert parse_listing("", LISTING_URL) == []
+    assert parse_listing("<html><body><p>No products</p></body></html>", LISTING_URL) == []
+
+
+def test_parse_detail(detail_html):
+    data = parse_detail(detail_html, PRODUCT_URL)
+    assert data["category"] == "Sliced Cheese"
+    assert (data["SKU_number"], data["UPC_number"]) == (103674, 103674)
+    assert data["table_data"] == [
+        ["Case", "Each"],
+        [["4 Eaches", "1 Item"], ['L 1" x W 1" x H 1"', 'L 1" x W 1" x H 1"'], ["5.15 lbs", "1.2875 lbs"]],
+    ]
+    assert data["weight"] == 1.2875
+    assert (data["price"], data["case_price"], data["case_size"]) == (16.76, 67.04, 4)
+    assert data["LB_price"] == 3.35
+    assert data["like_products"][0] == "Cheese, Provolone, Sliced, (8) 1.5 Lb - 103601"
+    assert data["related_products"] == ["Cheese, Swiss, Sliced, Processed, 120 Ct, (4) 5 Lb - 100014"]
+    assert data["product_images"][0].startswith("https://shop.kimelo.com/_next/image?url=")
+
+
+def test_parse_detail_single_price(detail_html):
+    html = detail_html.replace('<b class="chakra-text css-0">$67.04</b>', '')
+    data = parse_detail(html, PRODUCT_URL)
+    assert (data["price"], data["case_price"], data["case_size"]) == (16.76, 16.76, 1)
+
+
+def test_parse_product_merges_the_listing_entry(listing_html, detail_html):
+    listing = parse_listing(listing_html, LISTING_URL)[0]
+    record = parse_product(listing, detail_html)
+    assert record["brand"] == "Schreiber"
+    assert record["SKU_number"] == 103674
+
+
+@pytest.mark.parametrize("old, new, message", [
+    ("css-1811skr", "css-other", "price box"),
+    ("$67.04", "", "no number"),
+    ('<p class="chakra-text css-0">SKU: 103674</p>', "", "SKU"),
+    ("chakra-table css-5605sr", "css-other", "table"),
+    ("5.15 lbs</td><td class=\"css-1eyncsv\">1.2875 lbs", "", "no number"),
+])
+def test_parse_detail_missing_fields(detail_html, old, new, message):
+    assert old in detail_html
+    with pytest.raises(ParseError, match=message):
+        parse_detail(detail_html.replace(old, new), PRODUCT_URL)
+
+
+def test_parse_detail_without_prices(detail_html):
+    html = detail_html.replace('<b class="chakra-text css-0">$67.04</b>', '').replace('<b class="chakra-text css-0">$16.76</b>', '')
+    with pytest.raises(ParseError, match="no prices"):
+        parse_detail(html, PRODUCT_URL)
+
+
+def test_parse_detail_unrendered_page():
+    with pytest.raises(ParseError):
+        parse_detail("<html><body><div id='__next'></div></body></html>", PRODUCT_URL)
+
+
+@pytest.mark.parametrize("name", ["listing.html", "product_103674.html"])
+def test_backends_agree(monkeypatch, name):
+    pytest.importorskip("lxml")
+    html = page(name)
+
+    def parse(backend):
+        monkeypatch.setattr(parsers, "HTML_PARSER", backend)
+        if name == "listing.html":
+            return parse_listing(html, LISTING_URL)
+        return parse_detail(html, PRODUCT_URL)
+
+    assert parse("lxml") == parse("html.parser")
+
+
+def test_backends_collect_the_same_fields(detail_html, listing_html):
+    pytest.importorskip("lxml")
+    # Also on pages missing parts, where parse_detail would stop at the first ParseError
+    for html in (detail_html, detail_html.replace("css-1811skr", "css-other"), detail_html.replace("<tbody", "<tfoot")):
+        assert parsers._lxml_fields(html) == parsers._soup_fields(html)
+    assert parsers._lxml_cards(listing_html) == parsers._soup_cards(listing_html)
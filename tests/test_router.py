@@ -0,0 +1,27 @@
+from scripts.cheese_sql_chatbot import CheeseSQLChatbot
+from scripts.context_builder import normalize_product
+from scripts.retrievers import product_metadata, row_match
+from scripts.router import ProductLookup
+
+
+def test_sku_route_answers_without_the_model(catalog):
+    route = catalog.route("What is SKU 103674?")
+    assert route is not None and route.kind == "sku"
+    assert [m.id for m in route.matches] == ["product_103674"]
+    assert "Case size: 4" in route.answer
+
+
+def test_case_pricing_matches_across_paths(catalog, database, fake_openai):
+    routed = catalog.route("Tell me about 103674").matches[0]
+    rows = CheeseSQLChatbot(database, client=fake_openai).execute_query("SELECT * FROM products WHERE sku = '103674'")
+    from_sql = row_match(rows[0])
+    assert routed.metadata["case_size"] == 4
+    assert normalize_product(routed)["case"] == normalize_product(from_sql)["case"] == "4 for $67.04"
+
+
+def test_metadata_tolerates_missing_fields():
+    metadata = product_metadata({"name": "Mystery Cheese", "price": "", "SKU_number": 100001})
+    assert metadata["weight"] == 0.0 and metadata["case_size"] == 0 and metadata["case_price"] == 0.0
+    assert normalize_product(metadata)["case"] is None
+    lookup = ProductLookup([{"name": "Mystery Cheese", "SKU_number": 100001}])
+    assert lookup.route("sku 100001").matches[0].metadata["name"] == "Mystery Cheese"
@@ -0,0 +1,33 @@
+from scripts.memory import ConversationMemory
+from scripts.sessions import SessionStore
+
+
+def test_sessions_are_separate_and_bounded():
+    store = SessionStore(ConversationMemory, maxsize=2, idle_ttl=0, path=None)
+    store.get("a").add("Do you have feta?", "Yes.")
+    assert store.get("b").is_empty()
+    store.get("c")
+    # "a" was least recently used
+    assert store.get("a").is_empty()
+    assert store.stats()["evictions"] >= 1
+
+
+def test_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(ConversationMemory, path=path)
+    memory = store.get("abc")
+    memory.add("Do you have feta?", "Yes, in crumbles and blocks.")
+    store.save("abc", memory)
+
+    restarted = SessionStore(ConversationMemory, path=path)
+    assert list(restarted.get("abc").turns) == list(memory.turns)
+    restarted.clear("abc")
+    assert SessionStore(ConversationMemory, path=path).get("abc").is_empty()
+
+
+def test_chatbot_keeps_sessions_apart(make_chatbot):
+    bot = make_chatbot()
+    bot.chat("Can you recommend a cheese for pizza?", session_id="first")
+    assert not bot.memory_for("first").is_empty()
+    assert bot.memory_for("second").is_empty()
+    assert bot.memory_for(None).is_empty()